@@ -1,4 +1,4 @@
-from fs_manager import FileObject
-from fs_manager import DirectoryObject
-from fs_manager import AliasedDirectoryObject
-from fs_manager import FSManager
+from .fs_manager import FileObject
+from .fs_manager import DirectoryObject
+from .fs_manager import AliasedDirectoryObject
+from .fs_manager import FSManager
@@ -1,15 +1,36 @@
-from collections import MutableSequence
-from collections import MutableMapping
+from collections.abc import MutableSequence
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from copy import deepcopy
+from functools import lru_cache
+from functools import partial
+from operator import methodcaller
 import os
+import stat
+import mmap
 import shutil
 import tempfile
 import hashlib
-import re
-import logger
 import logging
 import json
+import weakref
+
+from . import logger
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 
 log = logging.getLogger()
@@ -17,16 +38,339 @@ log.setLevel(logging.DEBUG)
 log.addHandler(logger.FSMStreamHandler())
 
 
-re_url_tail = re.compile('[^\/]+$')
-re_url_head = re.compile('^[^\/]+')
-re_url_long_tail = re.compile('\/.+$')
-re_url_long_head = re.compile('^.+\/')
-
-
-CHUNK_SIZE = 65536
+MMAP_THRESHOLD = 1 << 20
+ABSPATH_CACHE_SIZE = 4096
+HASH_TYPES = ("md5", "sha1", "sha256")
+# Hashing threads mostly wait for disk, so there are more than CPUs
+HASH_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def _hash_constructor(name):
+    '''
+    Return hashlib constructor of the algorithm marked as non-security
+
+    Hash sums are used as content fingerprints only, so OpenSSL may pick
+    its fastest implementation on interpreters which support the flag
+
+    @param name: Name of the hashlib algorithm
+    @type name: `str`
+    '''
+
+    constructor = getattr(hashlib, name)
+    try:
+        # hashlib.new ignores the flag on Python 3.7 and 3.8, named
+        # constructors reject it, so the probe has to be the constructor
+        constructor(usedforsecurity=False)
+    except TypeError:
+        return constructor
+    return partial(constructor, usedforsecurity=False)
+
+
+# Constructors are resolved once, hashlib.new looks them up by name per call
+_hash_constructors = dict((name, _hash_constructor(name))
+                          for name in HASH_TYPES)
+
+# Non-cryptographic but much faster fingerprints, if they're installed
+if blake3 is not None:
+    # Big inputs are hashed by BLAKE3 own threads
+    _hash_constructors["blake3"] = partial(blake3.blake3,
+                                           max_threads=blake3.blake3.AUTO)
+    HASH_TYPES += ("blake3",)
+if xxhash is not None:
+    _hash_constructors["xxh3"] = xxhash.xxh3_64
+    HASH_TYPES += ("xxh3",)
+
+
+def _dump_json(obj, f, pretty=False):
+    '''
+    Write structure as UTF-8 encoded JSON to the file
+
+    @param obj: Structure to write
+    @type obj: `dict`
+    @param f: File object opened for writing in binary mode
+    @type f: `file`
+    @param pretty: Indent JSON for humans instead of compact output
+    @type pretty: `bool`
+    '''
+
+    if orjson is not None:
+        # orjson encodes straight to UTF-8 bytes
+        f.write(orjson.dumps(obj,
+                             option=orjson.OPT_INDENT_2 if pretty else None))
+    else:
+        f.write(json.dumps(obj,
+                           indent=4 if pretty else None,
+                           separators=(',', ':'),
+                           ensure_ascii=False).encode("utf-8"))
+
+
+def _load_json(f):
+    '''
+    Read structure from UTF-8 encoded JSON file
+
+    @param f: File object opened for reading in binary mode
+    @type f: `file`
+    @return: Loaded structure
+    '''
+
+    if orjson is not None:
+        return orjson.loads(f.read())
+    return json.loads(f.read())
+
+
+def _replace_json(obj, path, pretty=False):
+    '''
+    Atomically replace the file with structure written as JSON
+
+    @param obj: Structure to write
+    @type obj: `dict`
+    @param path: Path to the structure file
+    @type path: `str`
+    @param pretty: Indent JSON for humans instead of compact output
+    @type pretty: `bool`
+    '''
+
+    tmp_path = None
+    try:
+        # Unique name keeps concurrent writers and leftovers of a crash
+        # from clobbering each other
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=os.path.basename(path) + ".", suffix=".tmp",
+            dir=os.path.dirname(path))
+        # Readers see either the old or the new file, never a torn one
+        with os.fdopen(fd, "wb") as f:
+            try:
+                # Replaced file keeps its mode, new one is private
+                os.fchmod(f.fileno(), os.stat(path).st_mode & 0o777)
+            except FileNotFoundError:
+                pass
+            _dump_json(obj, f, pretty)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except (IOError, OSError) as exc:
+        log.error("Can't write file %s", path)
+        if tmp_path is not None:
+            _remove_path(tmp_path)
+        raise exc
+
+
+@lru_cache(maxsize=ABSPATH_CACHE_SIZE)
+def _abs_join(prefix_path, path):
+    '''
+    Return memoized absolute path of the path joined to the prefix path
+
+    @param prefix_path: Absolute prefix path
+    @type prefix_path: `str`
+    @param path: Relative or absolute path
+    @type path: `str`
+    '''
+
+    # Prefix path is always absolute, so abspath would only normalize
+    return os.path.normpath(os.path.join(prefix_path, path))
+
+
+def _remove_path(path):
+    '''
+    Remove file or directory left by a collected temporary resource
+
+    @param path: Path to the resource
+    @type path: `str`
+    '''
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _split(abs_path):
+    '''
+    Split normalized absolute path to the parent path and the name
+
+    @param abs_path: Normalized absolute path
+    @type abs_path: `str`
+    '''
+
+    head, _, tail = abs_path.rpartition(os.sep)
+    return head or os.sep, tail
+
+
+def _file_digest(path, algorithm):
+    '''
+    Return hex digest of the file content
+
+    @param path: Path to file
+    @type path: `str`
+    @param algorithm: Name of the hashlib algorithm
+    @type algorithm: `str`
+    '''
+
+    return _update_from_file(_hash_constructors[algorithm](), path) \
+        .hexdigest()
+
+
+def _stat_key(path):
+    '''
+    Return stat fingerprint of the file, which changes when it's rewritten
+
+    @param path: Path to file
+    @type path: `str`
+    @return: List of inode number, modification time in ns and size
+    '''
+
+    st = os.stat(path)
+    return [st.st_ino, st.st_mtime_ns, st.st_size]
+
+
+def _update_from_file(hash_sum, path, offset=0):
+    '''
+    Update hash object with the file content starting from the offset
+
+    @param hash_sum: hashlib hash object
+    @param path: Path to file
+    @type path: `str`
+    @param offset: Number of leading bytes of the file to skip
+    @type offset: `int`
+    @return: Updated hash object
+    '''
+
+    # Reads go straight into hashlib or mmap, a buffered reader adds nothing
+    with open(path, 'rb', 0) as f:
+        if os.fstat(f.fileno()).st_size - offset <= MMAP_THRESHOLD:
+            # Content fits one read and one update, readahead and page
+            # cache hints would cost more syscalls than the read itself
+            if offset:
+                f.seek(offset)
+            hash_sum.update(f.read())
+            return hash_sum
+
+        if hasattr(os, "posix_fadvise"):
+            # Widen kernel readahead as the file is read strictly in order
+            os.posix_fadvise(f.fileno(), offset, 0, os.POSIX_FADV_SEQUENTIAL)
+        try:
+            _update_from_mmap(hash_sum, f, offset)
+        except (ValueError, OSError):
+            # File can't be mapped, it's read in chunks then
+            f.seek(offset)
+            for chunk in iter(partial(f.read, MMAP_THRESHOLD), b""):
+                hash_sum.update(chunk)
+        finally:
+            if hasattr(os, "posix_fadvise"):
+                # Hashed file won't be re-read soon, release its page cache
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+    return hash_sum
+
+
+def _update_from_mmap(hash_sum, f, offset=0):
+    '''
+    Update hash object with the whole mapped file with one update call
+
+    Mapping errors are raised before the hash object is updated
+
+    @param hash_sum: hashlib hash object
+    @param f: File object opened in binary mode
+    @type f: `file`
+    @param offset: Number of leading bytes of the file to skip
+    @type offset: `int`
+    '''
+
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        # The view has to be released before the mapping is closed
+        with memoryview(mm)[offset:] as view:
+            hash_sum.update(view)
+
+
+def _copy_file(src, dst):
+    '''
+    Copy file content and metadata, inside the kernel when it's possible
+
+    @param src: Source path
+    @type src: `str`
+    @param dst: Destination path with file name included
+    @type dst: `str`
+    '''
+
+    # Destination is truncated on open, so the same file has to be caught
+    # before it, the way copy2 does
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(
+            "{!r} and {!r} are the same file".format(src, dst))
+
+    # Only regular files are copied by ranges, opening a FIFO would block
+    # and other special files are rejected by copy2 itself
+    if hasattr(os, "copy_file_range") and \
+            stat.S_ISREG(os.stat(src).st_mode):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(fsrc.fileno(), 0, 0,
+                                     os.POSIX_FADV_SEQUENTIAL)
+                # Stat size is only a hint, procfs, sysfs and some FUSE or
+                # network files report less than they have, so the copy
+                # goes on until the end of file
+                count = min(max(os.fstat(fsrc.fileno()).st_size, 1 << 23),
+                            1 << 30)
+                copied = 0
+                while True:
+                    sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(),
+                                              count)
+                    if not sent:
+                        break
+                    copied += sent
+            # Nothing copied is either an empty file or a file the kernel
+            # can't copy this way, copy2 tells them apart
+            if copied:
+                shutil.copystat(src, dst)
+                return
+        except OSError:
+            # Not supported by the kernel or the filesystem
+            pass
+
+    shutil.copy2(src, dst)
+
+
+def _hash_files(files, algorithm, max_workers=HASH_WORKERS):
+    '''
+    Return hash sums of the files computed concurrently
+
+    @param files: File objects
+    @type files: `list`
+    @param algorithm: Name of the hashlib algorithm
+    @type algorithm: `str`
+    @param max_workers: Maximum number of hashing threads
+    @type max_workers: `int`
+    @return: List of hash sums in order of the files
+    '''
+
+    method = methodcaller(algorithm)
+    if len(files) < 2:
+        return [method(f) for f in files]
+
+    workers = min(max_workers, len(files))
+    # Each task hashes a batch of files, so small files don't pay for a
+    # future and a queue round-trip per file. A few batches per worker
+    # keep threads busy when file sizes differ
+    size = -(-len(files) // (workers * 4))
+    batches = [files[i:i + size] for i in range(0, len(files), size)]
+
+    # hashlib releases the GIL while hashing, so threads overlap both
+    # disk reads and hash computation of different files
+    def hash_batch(batch):
+        return [method(f) for f in batch]
+
+    with ThreadPoolExecutor(workers) as executor:
+        return [hashsum for hashsums in executor.map(hash_batch, batches)
+                for hashsum in hashsums]
 
 
 class FileObject(object):
+    __slots__ = ('_path', '_temporary', '_finalizer', 'file_path',
+                 'file_name', '_parent', '_mode', '__weakref__')
+
     def __init__(self, path, mode=0o600, temporary=False, parent=None):
         '''
         Create new file or use already existing one
@@ -41,26 +385,27 @@ class FileObject(object):
         @type temporary: `bool`
         '''
 
-        self._parent = None
-        self.parent = parent
         self._path = os.path.abspath(path)
+        self._finalizer = None
         self.temporary = temporary
-        self.file_name = re_url_tail.search(self.path).group(0)
-        self.file_path = re_url_long_head.search(self.path).group(0)
+        self.file_path, self.file_name = _split(self._path)
+        self._parent = None
+        self.parent = parent
 
-        if os.path.exists(self.path):
-            self.mode = os.stat(self.path).st_mode
-        else:
+        try:
+            # One stat both tells that resource exists and gives its mode
+            self._mode = os.stat(self._path).st_mode & 0o777
+        except OSError:
             self._mode = mode
             self.create()
 
-    def __del__(self):
-        if self.temporary and os.path.exists(self.path):
-            self.remove()
-
     def __eq__(self, other):
         return isinstance(other, FileObject) and self.path == other.path
 
+    # Equality follows the path, which changes on `move`, so objects
+    # can't be hashed by it
+    __hash__ = None
+
     def __repr__(self):
         return "{}({})".format(
             self.__class__.__name__, repr(self.path)
@@ -80,7 +425,7 @@ class FileObject(object):
     def path(self, value):
         new_abspath = os.path.abspath(value)
         if new_abspath != self.path:
-            self.__init__(new_abspath, self.parent, self.mode, self.temporary)
+            self.move(new_abspath)
 
     @path.deleter
     def path(self):
@@ -88,7 +433,8 @@ class FileObject(object):
 
     @property
     def mode(self):
-        self._mode = os.stat(self.path).st_mode & 0o777
+        if self._mode is None:
+            self._mode = os.stat(self.path).st_mode & 0o777
         return self._mode
 
     @mode.setter
@@ -97,7 +443,20 @@ class FileObject(object):
 
     @mode.deleter
     def mode(self):
-        del self._mode
+        self._mode = None
+
+    @property
+    def temporary(self):
+        return self._temporary
+
+    @temporary.setter
+    def temporary(self, value):
+        self._temporary = value
+        self._track()
+
+    @temporary.deleter
+    def temporary(self):
+        del self._temporary
 
     @property
     def parent(self):
@@ -120,18 +479,36 @@ class FileObject(object):
             self.parent.pop(self.parent.index(self))
             self._parent = None
 
+    def _track(self):
+        '''Remove temporary file from the system once it's collected'''
+
+        if self._finalizer is not None:
+            self._finalizer.detach()
+            self._finalizer = None
+        if self._temporary:
+            self._finalizer = weakref.finalize(self, _remove_path, self._path)
+
     def create(self):
         '''Create file on the system'''
 
         try:
-            if not os.path.exists(self.path):
-                f = open(self.path, 'w')
-                f.close()
-                self.chmod(self._mode)
-        except IOError as exc:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY,
+                         self._mode)
+        except FileExistsError:
+            return
+        except OSError as exc:
             log.error("Can't create file")
             raise exc
 
+        try:
+            # Mode bits passed to open are masked by umask
+            os.fchmod(fd, self._mode)
+        except OSError as exc:
+            log.error("Can't change file permissions")
+            raise exc
+        finally:
+            os.close(fd)
+
     def remove(self):
         '''Remove file from the system'''
 
@@ -152,7 +529,7 @@ class FileObject(object):
 
         try:
             os.chmod(self.path, mode)
-            self._mode = mode
+            self._mode = mode & 0o777
         except OSError as exc:
             if exc.errno == 1:
                 log.error("Can't change file permissions under current user")
@@ -173,6 +550,10 @@ class FileObject(object):
         try:
             os.rename(self.path, abs_dst)
             self._path = abs_dst
+            self.file_path, self.file_name = _split(abs_dst)
+            self._track()
+            if self.parent:
+                self.parent._reindex()
         except OSError as exc:
             log.error("Can't move file")
             raise exc
@@ -190,8 +571,8 @@ class FileObject(object):
 
         abs_dst = os.path.abspath(dst)
         try:
-            shutil.copy2(self.path, abs_dst)
-        except IOError as exc:
+            _copy_file(self.path, abs_dst)
+        except (IOError, OSError) as exc:
             log.error("Can't copy file")
             raise exc
 
@@ -199,33 +580,63 @@ class FileObject(object):
                           self.parent if same_parent else None)
 
     def md5(self):
-        '''Get md5 hash sum of the file'''
+        '''
+        Get md5 hash sum of the file
 
-        md5_sum = hashlib.md5()
-        with open(self.path, 'rb') as f:
-            while True:
-                resources = f.read(CHUNK_SIZE)
-                if not resources:
-                    break
-                md5_sum.update(resources)
+        Kept for compatibility, prefer `sha256` which is hardware
+        accelerated on modern CPUs.
+        '''
 
-        return md5_sum.hexdigest()
+        return _file_digest(self.path, "md5")
 
     def sha1(self):
         '''Get sha1 hash sum of the file'''
 
-        sha1_sum = hashlib.sha1()
-        with open(self.path, 'rb') as f:
-            while True:
-                resources = f.read(CHUNK_SIZE)
-                if not resources:
-                    break
-                sha1_sum.update(resources)
+        return _file_digest(self.path, "sha1")
+
+    def sha256(self):
+        '''Get sha256 hash sum of the file'''
+
+        return _file_digest(self.path, "sha256")
+
+    def blake3(self):
+        '''Get BLAKE3 hash sum of the file, blake3 package is required'''
 
-        return sha1_sum.hexdigest()
+        if blake3 is None:
+            log.error("Install blake3 package to get BLAKE3 hash sums")
+            raise ImportError("No module named 'blake3'")
+        return _file_digest(self.path, "blake3")
+
+    def xxh3(self):
+        '''Get XXH3 64-bit hash sum of the file, xxhash package is required'''
+
+        if xxhash is None:
+            log.error("Install xxhash package to get XXH3 hash sums")
+            raise ImportError("No module named 'xxhash'")
+        return _file_digest(self.path, "xxh3")
+
+    def hash_from(self, hash_sum, offset=0):
+        '''
+        Get hash sum of the file continuing from the seeded hash object.
+        A hash object fed with a header shared by many files saves hashing
+        that header again for each of them.
+
+        @param hash_sum: hashlib hash object, it's copied and stays intact
+        @param offset: Number of leading bytes of the file hash object
+        has consumed already
+        @type offset: `int`
+        @return: Hex digest
+        '''
+
+        return _update_from_file(hash_sum.copy(), self.path, offset) \
+            .hexdigest()
 
 
 class DirectoryObject(MutableSequence, object):
+    __slots__ = ('_path', '_temporary', '_finalizer', 'dir_path', 'dir_name',
+                 'resources', '_by_id', '_by_path', '_parent', '_mode',
+                 '__weakref__')
+
     def __init__(self, path, mode=0o700, temporary=False, parent=None):
         '''
         Create new directory or use already existing one
@@ -242,16 +653,19 @@ class DirectoryObject(MutableSequence, object):
         '''
 
         self._path = os.path.abspath(path)
+        self._finalizer = None
         self.temporary = temporary
-        self.dir_name = re_url_tail.search(self.path).group(0)
-        self.dir_path = re_url_long_head.search(self.path).group(0)
+        self.dir_path, self.dir_name = _split(self._path)
         self.resources = []
+        self._by_id = dict()
+        self._by_path = dict()
         self._parent = None
         self.parent = parent
 
-        if os.path.exists(self.path):
-            self._mode = os.stat(self.path).st_mode
-        else:
+        try:
+            # One stat both tells that resource exists and gives its mode
+            self._mode = os.stat(self._path).st_mode & 0o777
+        except OSError:
             self._mode = mode
             self.create()
 
@@ -262,9 +676,11 @@ class DirectoryObject(MutableSequence, object):
 
     def __setitem__(self, index, value):
         self.resources[index] = value
+        self._reindex()
 
     def __delitem__(self, index):
         del self.resources[index]
+        self._reindex()
 
     def __iter__(self):
         return iter(self.resources)
@@ -274,13 +690,13 @@ class DirectoryObject(MutableSequence, object):
 
     # Collection methods end
 
-    def __del__(self):
-        if self.temporary and os.path.exists(self.path):
-            self.remove()
-
     def __eq__(self, other):
         return isinstance(other, DirectoryObject) and self.path == other.path
 
+    # Equality follows the path, which changes on `move`, so objects
+    # can't be hashed by it
+    __hash__ = None
+
     def __repr__(self):
         return "{}({})".format(
             self.__class__.__name__, repr(self.path)
@@ -300,7 +716,7 @@ class DirectoryObject(MutableSequence, object):
     def path(self, value):
         new_abspath = os.path.abspath(value)
         if new_abspath != self.path:
-            self.__init__(new_abspath, self.parent, self.mode, self.temporary)
+            self.move(new_abspath)
 
     @path.deleter
     def path(self):
@@ -308,7 +724,8 @@ class DirectoryObject(MutableSequence, object):
 
     @property
     def mode(self):
-        self._mode = os.stat(self.path).st_mode & 0o777
+        if self._mode is None:
+            self._mode = os.stat(self.path).st_mode & 0o777
         return self._mode
 
     @mode.setter
@@ -317,7 +734,20 @@ class DirectoryObject(MutableSequence, object):
 
     @mode.deleter
     def mode(self):
-        del self._mode
+        self._mode = None
+
+    @property
+    def temporary(self):
+        return self._temporary
+
+    @temporary.setter
+    def temporary(self, value):
+        self._temporary = value
+        self._track()
+
+    @temporary.deleter
+    def temporary(self):
+        del self._temporary
 
     @property
     def parent(self):
@@ -340,12 +770,24 @@ class DirectoryObject(MutableSequence, object):
             self.parent.pop(self.parent.index(self))
             self._parent = None
 
+    def _track(self):
+        '''Remove temporary directory from the system once it's collected'''
+
+        if self._finalizer is not None:
+            self._finalizer.detach()
+            self._finalizer = None
+        if self._temporary:
+            self._finalizer = weakref.finalize(self, _remove_path, self._path)
+
     def create(self):
         '''Create directory on the system'''
 
         try:
-            if not os.path.exists(self.path):
-                os.mkdir(self.path, self._mode)
+            os.mkdir(self.path, self._mode)
+            # Actual mode bits of the new directory depend on umask
+            self._mode = os.stat(self.path).st_mode & 0o777
+        except FileExistsError:
+            return
         except OSError as exc:
             log.error("Can't create directory")
             raise exc
@@ -372,7 +814,7 @@ class DirectoryObject(MutableSequence, object):
 
         try:
             os.chmod(self.path, mode)
-            self._mode = mode
+            self._mode = mode & 0o777
         except OSError as exc:
             if exc.errno == 1:
                 log.error("Can't change directory "
@@ -394,6 +836,10 @@ class DirectoryObject(MutableSequence, object):
         try:
             os.rename(self.path, abs_dst)
             self._path = abs_dst
+            self.dir_path, self.dir_name = _split(abs_dst)
+            self._track()
+            if self.parent:
+                self.parent._reindex()
         except OSError as exc:
             raise exc
 
@@ -410,14 +856,33 @@ class DirectoryObject(MutableSequence, object):
 
         abs_dst = os.path.abspath(dst)
         try:
-            shutil.copytree(self.path, abs_dst)
-        except IOError as exc:
+            shutil.copytree(self.path, abs_dst, copy_function=_copy_file)
+        except (IOError, OSError) as exc:
             log.error("Can't copy directory")
             raise exc
 
         return DirectoryObject(abs_dst, self.mode, self.temporary,
                                self.parent if same_parent else None)
 
+    def hash_all(self, algo="sha1", max_workers=HASH_WORKERS):
+        '''
+        Get hash sums of all the files in collection concurrently
+
+        @param algo: Hashsum method
+        @type algo: `str`
+        @param max_workers: Maximum number of hashing threads
+        @type max_workers: `int`
+        @return: Dictionary of file paths and their hash sums
+        '''
+
+        if algo not in HASH_TYPES:
+            log.info("Unsupported hashsum method '%s'", algo)
+            return dict()
+
+        files = [el for el in self.resources if isinstance(el, FileObject)]
+        return dict(zip([f.path for f in files],
+                        _hash_files(files, algo, max_workers)))
+
     # Collection methods start
 
     def append(self, resource):
@@ -426,6 +891,8 @@ class DirectoryObject(MutableSequence, object):
         if isinstance(resource, FileObject) or \
             isinstance(resource, DirectoryObject) and \
                 self.index(resource) is None:
+            self._by_id[id(resource)] = len(self.resources)
+            self._by_path.setdefault(resource.path, len(self.resources))
             self.resources.append(resource)
             resource._parent = self
 
@@ -436,25 +903,52 @@ class DirectoryObject(MutableSequence, object):
             isinstance(resource, DirectoryObject) and \
                 self.index(resource) is None:
             self.resources.insert(index, resource)
+            self._reindex()
             resource._parent = self
 
     def index(self, resource=None, path=None):
         '''Return the index of resource'''
 
-        for el_idx, el in enumerate(self.resources):
-            if el == resource or path == el.path:
+        if resource is not None:
+            el_idx = self._by_id.get(id(resource))
+            if el_idx is None:
+                el_idx = self._by_path.get(getattr(resource, "path", None))
+            if el_idx is not None and self.resources[el_idx] == resource:
                 return el_idx
 
+        return self._by_path.get(path)
+
     def pop(self, idx):
         '''Return resource on "idx" index and delete it then'''
 
-        self.resources[idx]._parent = None
-        return self.resources.pop(idx)
+        resource = self.resources.pop(idx)
+        resource._parent = None
+        if idx in (-1, len(self.resources)):
+            # Positions of the rest are intact, drop only the popped ones
+            if self._by_id.get(id(resource)) == len(self.resources):
+                del self._by_id[id(resource)]
+            if self._by_path.get(resource.path) == len(self.resources):
+                del self._by_path[resource.path]
+        else:
+            self._reindex()
+        return resource
+
+    def _reindex(self):
+        '''Rebuild lookup tables of the resources positions'''
+
+        by_id = self._by_id = dict()
+        by_path = self._by_path = dict()
+        setdefault = by_path.setdefault
+        for el_idx, el in enumerate(self.resources):
+            by_id[id(el)] = el_idx
+            setdefault(el.path, el_idx)
 
     # Collection methods end
 
 
 class AliasedDirectoryObject(MutableMapping, DirectoryObject, object):
+    __slots__ = ('aliases',)
+
     def __init__(self, path, mode=0o700, temporary=False, parent=None):
         self.aliases = dict()
         DirectoryObject.__init__(self, path, mode, temporary, parent)
@@ -465,7 +959,10 @@ class AliasedDirectoryObject(MutableMapping, DirectoryObject, object):
         return self.aliases[key]
 
     def __setitem__(self, key, value):
-        self.aliases[key] = self.resources[self.resources.index(value)]
+        idx = self.index(value)
+        if idx is None:
+            raise ValueError("{} is not in collection".format(repr(value)))
+        self.aliases[key] = self.resources[idx]
 
     def __delitem__(self, key):
         del self.aliases[key]
@@ -476,6 +973,13 @@ class AliasedDirectoryObject(MutableMapping, DirectoryObject, object):
     def __len__(self):
         return len(self.aliases)
 
+    # Mapping mixins probe through `__getitem__` and catch KeyError
+    def __contains__(self, key):
+        return key in self.aliases
+
+    def get(self, key, default=None):
+        return self.aliases.get(key, default)
+
     # Collection methods end
 
     def __eq__(self, other):
@@ -487,13 +991,12 @@ class AliasedDirectoryObject(MutableMapping, DirectoryObject, object):
     def pop(self, idx):
         '''Return resource on "idx" index and delete it then'''
 
-        self.resources[idx]._parent = None
-        return self.resources.pop(idx)
+        return DirectoryObject.pop(self, idx)
 
 
 class FSManager(object):
     def __init__(self, base_path="/tmp/fs-manager/", mode=0o700,
-                 temporary=False):
+                 temporary=False, pretty_json=False):
         '''
         Initialize ResourceManger within the prefix path
 
@@ -505,10 +1008,14 @@ class FSManager(object):
         with all the resources under it after script is done?
         Also randomly generated directory will be used as prefix.
         @type temporary: `bool`
+        @param pretty_json: Indent structure files to be read by humans,
+        they're written compact otherwise
+        @type pretty_json: `bool`
         '''
 
         self.base_path = os.path.abspath(base_path)
         self._temporary = temporary
+        self.pretty_json = pretty_json
         DirectoryObject(self.base_path, mode).chmod(mode)
 
         self.prefix_path = tempfile.mkdtemp(prefix=self.base_path + "/") \
@@ -521,14 +1028,19 @@ class FSManager(object):
         self.load()
 
     def __del__(self):
-        if self.temporary and os.path.exists(self.root_directory.path):
-            self.remove()
+        self.close()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.__del__()
+        self.close()
+
+    def close(self):
+        '''Remove all the resources if FSManager is temporary'''
+
+        if self.temporary and os.path.exists(self.root_directory.path):
+            self.remove()
 
     @property
     def temporary(self):
@@ -542,22 +1054,32 @@ class FSManager(object):
     def temporary(self):
         del self.temporary
 
-    def _prepare(self, path):
+    @property
+    def prefix_path(self):
+        return self._prefix_path
+
+    @prefix_path.setter
+    def prefix_path(self, value):
+        self._prefix_path = value
+        # Joiner bound to the current prefix, called instead of `abspath`
+        # on the internal paths to skip the method dispatch
+        self._abspath = partial(_abs_join, value)
+
+    def _prepare(self, abs_path):
         '''
         Pre-create row of the directories for resource
 
-        @param path: Initial path. Tail - name of file/directory, head - path.
-        @type path: `str`
+        @param abs_path: Normalized absolute path.
+        Tail - name of file/directory, head - path.
+        @type abs_path: `str`
         '''
 
-        abs_path = self.abspath(path)
-        prefix = re_url_long_head.search(abs_path).group(0)
-        if not os.path.exists(prefix):
-            try:
-                os.makedirs(prefix)
-            except OSError as exc:
-                log.error("Can't create prefix for path")
-                raise exc
+        prefix = _split(abs_path)[0]
+        try:
+            os.makedirs(prefix, exist_ok=True)
+        except OSError as exc:
+            log.error("Can't create prefix for path")
+            raise exc
 
     def resource(self, alias):
         '''
@@ -568,12 +1090,14 @@ class FSManager(object):
         @return: FileObject/DirectoryObject resource
         '''
 
-        if alias in self.current_directory:
-            if not os.path.exists(self.current_directory[alias].path):
-                log.warning("There is no such resource at {}".
-                            format(self.current_directory[alias].path))
+        resource = self.current_directory.get(alias)
+        if resource is not None:
+            # Existence is checked only to warn about it
+            if log.isEnabledFor(logging.WARNING) and \
+                    not os.path.exists(resource.path):
+                log.warning("There is no such resource at %s", resource.path)
 
-            return self.current_directory[alias]
+            return resource
 
     def file(self, alias):
         '''
@@ -584,13 +1108,13 @@ class FSManager(object):
         @return: FileObject resource
         '''
 
-        if alias in self.current_directory and \
-                isinstance(self.current_directory[alias], FileObject):
-            if not os.path.exists(self.current_directory[alias].path):
-                log.warning("There is no such file at {}".
-                            format(self.current_directory[alias]))
+        resource = self.current_directory.get(alias)
+        if isinstance(resource, FileObject):
+            if log.isEnabledFor(logging.WARNING) and \
+                    not os.path.exists(resource.path):
+                log.warning("There is no such file at %s", resource)
 
-            return self.current_directory[alias]
+            return resource
 
     def dir(self, alias):
         '''
@@ -601,13 +1125,13 @@ class FSManager(object):
         @return: DirectoryObject resource
         '''
 
-        if alias in self.current_directory and \
-                isinstance(self.current_directory[alias], DirectoryObject):
-            if not os.path.exists(self.current_directory[alias].path):
-                log.warning("There is no such directory at {}".
-                            format(self.current_directory[alias]))
+        resource = self.current_directory.get(alias)
+        if isinstance(resource, DirectoryObject):
+            if log.isEnabledFor(logging.WARNING) and \
+                    not os.path.exists(resource.path):
+                log.warning("There is no such directory at %s", resource)
 
-            return self.current_directory[alias]
+            return resource
 
     def cd(self, alias):
         '''
@@ -617,25 +1141,26 @@ class FSManager(object):
         @type alias: `str`
         '''
 
-        if self.dir(alias) is not None:
+        directory = self.dir(alias)
+        if directory is not None:
             self.pred = self.current_directory
-            self.prefix_path = self.dir(alias).path
-            self.current_directory = self.dir(alias)
+            self.prefix_path = directory.path
+            self.current_directory = directory
         else:
-            log.info("There is no such directory '{}'".format(alias))
+            log.info("There is no such directory '%s'", alias)
 
     def up(self):
         '''Switch to parent directory'''
 
         if self.current_directory.parent:
             self.pred = self.current_directory
-            self.prefix_path = self.abspath(self.current_directory.parent.path)
+            self.prefix_path = self.current_directory.parent.path
             self.current_directory = self.current_directory.parent
 
     def back(self):
         '''Switch to previous directory'''
 
-        self.prefix_path = self.abspath(self.pred.path)
+        self.prefix_path = self.pred.path
         self.current_directory = self.pred
 
     def cd_root(self):
@@ -659,16 +1184,16 @@ class FSManager(object):
             f = open(self.file(alias).path, mode)
         else:
             try:
-                f = open(self.abspath(alias), mode)
+                f = open(self._abspath(alias), mode)
             except IOError as exc:
-                log.error("Can't open file {}".format(self.abspath(alias)))
+                log.error("Can't open file %s", self._abspath(alias))
                 raise exc
 
         try:
             yield f
             f.close()
         except IOError as exc:
-            log.error("Can't open file {}".format(self.abspath(alias)))
+            log.error("Can't open file %s", self._abspath(alias))
             raise exc
 
     def remove(self):
@@ -688,7 +1213,7 @@ class FSManager(object):
         @type path: `str`
         '''
 
-        return os.path.exists(self.abspath(path))
+        return os.path.exists(self._abspath(path))
 
     def abspath(self, path=""):
         '''
@@ -697,10 +1222,8 @@ class FSManager(object):
         @param path: Relative or absolute path
         @type path: `str`
         '''
-        if path.startswith("/"):
-            return os.path.abspath(path)
-        else:
-            return os.path.abspath(os.path.join(self.prefix_path, path))
+
+        return self._abspath(path)
 
     def mkfile(self, alias=None, path=None, mode=0o600, temporary=False):
         '''
@@ -729,9 +1252,9 @@ class FSManager(object):
 
         if self.resource(_alias):
             log.info("File hasn't been created. "
-                     "There is already such an alias '{}'".format(_alias))
+                     "There is already such an alias '%s'", _alias)
         else:
-            abs_path = self.abspath(_path)
+            abs_path = self._abspath(_path)
             self._prepare(abs_path)
             self.current_directory[_alias] = FileObject(abs_path, mode,
                                                         temporary,
@@ -766,9 +1289,9 @@ class FSManager(object):
 
         if self.resource(_alias):
             log.info("Directory hasn't been created. "
-                     "There is already such an alias '{}'".format(_alias))
+                     "There is already such an alias '%s'", _alias)
         else:
-            abs_path = self.abspath(_path)
+            abs_path = self._abspath(_path)
             self._prepare(abs_path)
             self.current_directory[_alias] = \
                 AliasedDirectoryObject(abs_path, mode, temporary,
@@ -786,8 +1309,9 @@ class FSManager(object):
         @type mode: `int`
         '''
 
-        if self.resource(alias) is not None:
-            self.current_directory[alias].chmod(mode)
+        resource = self.resource(alias)
+        if resource is not None:
+            resource.chmod(mode)
             if not self.temporary:
                 self.save()
 
@@ -801,15 +1325,14 @@ class FSManager(object):
         @type new_alias: `str`
         '''
 
-        if self.resource(alias) is not None:
-            self.current_directory[new_alias] = \
-                deepcopy(self.current_directory[alias])
+        resource = self.resource(alias)
+        if resource is not None:
+            self.current_directory[new_alias] = resource
             del self.current_directory[alias]
             if not self.temporary:
                 self.save()
         else:
-            log.warning("There is no such resource with alias {}".
-                        format(alias))
+            log.warning("There is no such resource with alias %s", alias)
 
     def rm(self, alias):
         '''
@@ -819,8 +1342,9 @@ class FSManager(object):
         @type alias: `str`
         '''
 
-        if self.resource(alias) is not None:
-            self.current_directory[alias].remove()
+        resource = self.resource(alias)
+        if resource is not None:
+            resource.remove()
             del self.current_directory[alias]
             if not self.temporary:
                 self.save()
@@ -841,24 +1365,23 @@ class FSManager(object):
             log.info("Only relative paths allowed")
             return
 
-        if self.resource(salias) is not None:
+        resource = self.resource(salias)
+        if resource is not None:
+            target = None if dst is not None else self.resource(dalias)
             if dst is not None:
-                abs_path = self.abspath(dst)
+                abs_path = self._abspath(dst)
                 self._prepare(abs_path)
-                self.current_directory[dalias] = \
-                    self.current_directory[salias].copy(abs_path)
-            elif self.dir(dalias) is not None:
+                self.current_directory[dalias] = resource.copy(abs_path)
+            elif isinstance(target, DirectoryObject):
                 self.current_directory[os.path.join(dalias, salias)] = \
-                    self.current_directory[salias]. \
-                        copy(os.path.join(self.dir(dalias).path, salias))
-            elif self.file(dalias) is not None:
-                log.info("There is already file witch such alias {}".
-                         format(dalias))
+                    resource.copy(os.path.join(target.path, salias))
+            elif isinstance(target, FileObject):
+                log.info("There is already file witch such alias %s",
+                         dalias)
             else:
-                abs_path = self.abspath(dalias)
+                abs_path = self._abspath(dalias)
                 self._prepare(abs_path)
-                self.current_directory[dalias] = \
-                    self.current_directory[salias].copy(abs_path)
+                self.current_directory[dalias] = resource.copy(abs_path)
             if not self.temporary:
                 self.save()
 
@@ -878,18 +1401,20 @@ class FSManager(object):
             log.info("Only relative paths allowed")
             return
 
-        if self.resource(salias) is not None:
+        resource = self.resource(salias)
+        if resource is not None:
+            target = None if dst is not None else self.dir(dalias)
             if dst is not None:
-                abs_path = self.abspath(dst)
+                abs_path = self._abspath(dst)
                 self._prepare(abs_path)
-                self.current_directory[salias].move(abs_path)
-            elif self.dir(dalias) is not None:
-                self.current_directory[salias].move(self.dir(dalias).path)
+                resource.move(abs_path)
+            elif target is not None:
+                resource.move(target.path)
             else:
-                abs_path = self.abspath(dalias)
+                abs_path = self._abspath(dalias)
                 self._prepare(abs_path)
-                self.current_directory[salias].move(abs_path)
-            self.current_directory[dalias] = self.current_directory[salias]
+                resource.move(abs_path)
+            self.current_directory[dalias] = resource
             del self.current_directory[salias]
             if not self.temporary:
                 self.save()
@@ -900,27 +1425,26 @@ class FSManager(object):
         if not self.current_directory:
             return ""
 
-        res = ""
-        dash = " ------- "
+        dash = " ------- " * 5
 
-        max_len = len(max(self.current_directory.keys(), key=len))
-        max_tabs = max_len / 8
+        max_len = max(map(len, self.current_directory.keys()))
+        max_tabs = max_len // 8
         max_tabs += 1 if max_len % 8 else 0
 
-        for key, val in self.current_directory.iteritems():
-            tabs_n = max_tabs - len(key) / 8
-            tabs = "\t" * tabs_n
-            type = "[File]\t\t" if isinstance(val, FileObject) \
+        parts = []
+        for key, val in self.current_directory.items():
+            tabs = "\t" * (max_tabs - len(key) // 8)
+            type_ = "[File]\t\t" if isinstance(val, FileObject) \
                 else "[Directory]\t"
-            res += "{0}{3}{4}{5}\t{2}{1}\n".format(key, val.path, dash * 5,
-                                                   tabs, type, oct(val.mode))
-        print res
+            parts.append("{0}{1}{2}{3}\t{4}{5}\n".format(
+                key, tabs, type_, oct(val.mode), dash, val.path))
+        print("".join(parts))
 
     def save(self):
         '''Save current fs entry to structure .json file'''
 
         current_fs_struct = dict()
-        for alias, value in self.current_directory.iteritems():
+        for alias, value in self.current_directory.items():
             current_fs_struct[alias] = \
                 {"path": os.path.relpath(value.path, self.root_directory.path),
                  "mode": value.mode,
@@ -931,21 +1455,18 @@ class FSManager(object):
             else:
                 current_fs_struct[alias]["type"] = "directory"
 
-        with self.open(".fs-structure.json", "w") as f:
-            f.write(unicode(json.dumps(current_fs_struct,
-                                       indent=4,
-                                       separators=(',', ':'),
-                                       ensure_ascii=False)))
+        with self.open(".fs-structure.json", "wb") as f:
+            _dump_json(current_fs_struct, f, self.pretty_json)
 
     def load(self):
         '''Load current fs entry from structure .json file'''
 
         if self.exists(".fs-structure.json"):
             current_fs_struct = dict()
-            with self.open(".fs-structure.json", "r") as f:
-                current_fs_struct = json.load(f)
+            with self.open(".fs-structure.json", "rb") as f:
+                current_fs_struct = _load_json(f)
 
-            for alias, value in current_fs_struct.iteritems():
+            for alias, value in current_fs_struct.items():
                 if value["type"] == "file":
                     self.mkfile(alias, value["path"], value["mode"],
                                 value["temporary"])
@@ -965,42 +1486,37 @@ class FSManager(object):
         @type root_binded: `bool`
         '''
 
-        def dir_cerator(long_path):
-            head = re_url_head.search(long_path)
-            tail = re_url_long_tail.search(long_path)
-            if head:
-                self.mkdir(head.group(0))
-                self.cd(head.group(0))
-                if tail:
-                    dir_cerator(tail.group(0)[1:])
-                self.up()
-
-        def file_creator(long_path):
-            head = re_url_head.search(long_path)
-            tail = re_url_long_tail.search(long_path)
-            if head:
-                if tail:
-                    self.cd(head.group(0))
-                    file_creator(tail.group(0)[1:])
-                else:
-                    self.mkfile(head.group(0))
-                self.up()
-
-        for path, dirs, files in os.walk(self.prefix_path):
-            for dir_entry in dirs:
-                full_path = os.path.relpath(os.path.join(path, dir_entry),
-                                            self.prefix_path)
-                if root_binded:
-                    self.mkdir(full_path)
-                else:
-                    dir_cerator(full_path)
-            for file_entry in files:
-                full_path = os.path.relpath(os.path.join(path, file_entry),
-                                            self.prefix_path)
+        start_directory = self.current_directory
+        start_path = self.prefix_path
+        # Walked directories are looked up by path, so every entry is made
+        # right in its parent instead of re-walking its relative path
+        directories = {start_path: start_directory}
+        try:
+            for path, dirs, files in os.walk(start_path):
                 if root_binded:
-                    self.mkfile(full_path)
-                else:
-                    file_creator(full_path)
+                    # Walked paths are joined to the start path by os.walk
+                    rel_path = path[len(start_path):].lstrip(os.sep)
+                    for dir_entry in dirs:
+                        self.mkdir(os.path.join(rel_path, dir_entry))
+                    for file_entry in files:
+                        self.mkfile(os.path.join(rel_path, file_entry))
+                    continue
+
+                self.current_directory = directories.pop(path)
+                self.prefix_path = path
+                walk_dirs = list()
+                for dir_entry in dirs:
+                    self.mkdir(dir_entry)
+                    directory = self.current_directory.get(dir_entry)
+                    if isinstance(directory, DirectoryObject):
+                        directories[os.path.join(path, dir_entry)] = directory
+                        walk_dirs.append(dir_entry)
+                dirs[:] = walk_dirs
+                for file_entry in files:
+                    self.mkfile(file_entry)
+        finally:
+            self.current_directory = start_directory
+            self.prefix_path = start_path
 
     def save_all(self, path=".fs-structure-full.json"):
         '''
@@ -1010,29 +1526,23 @@ class FSManager(object):
         @type path: `str`
         '''
 
-        self.cd_root()
+        root_path = self.root_directory.path
         fs_struct = dict()
-
-        def decompose(current_fs_struct):
-            for alias, value in self.current_directory.iteritems():
-                current_fs_struct[alias] = \
-                    {"path": os.path.relpath(value.path,
-                                             self.root_directory.path),
+        # Walk the tree by references, current directory stays untouched
+        stack = [(self.root_directory, fs_struct)]
+        while stack:
+            directory, current_fs_struct = stack.pop()
+            for alias, value in directory.items():
+                entry = current_fs_struct[alias] = \
+                    {"path": os.path.relpath(value.path, root_path),
                      "mode": value.mode,
                      "temporary": value.temporary}
 
                 if isinstance(value, DirectoryObject):
-                    current_fs_struct[alias]["resources"] = dict()
-                    self.cd(alias)
-                    decompose(current_fs_struct[alias]["resources"])
-                    self.up()
+                    entry["resources"] = dict()
+                    stack.append((value, entry["resources"]))
 
-        decompose(fs_struct)
-        with self.open(path, "w") as f:
-            f.write(unicode(json.dumps(fs_struct,
-                                       indent=4,
-                                       separators=(',', ':'),
-                                       ensure_ascii=False)))
+        _replace_json(fs_struct, _abs_join(root_path, path), self.pretty_json)
 
     def load_all(self, path=".fs-structure-full.json"):
         '''
@@ -1046,7 +1556,7 @@ class FSManager(object):
         fs_struct = dict()
 
         def compose(current_fs_struct):
-            for alias, value in current_fs_struct.iteritems():
+            for alias, value in current_fs_struct.items():
                 if "resources" in value:
                     self.mkdir(alias, value["path"], value["mode"],
                                value["temporary"])
@@ -1057,10 +1567,44 @@ class FSManager(object):
                     self.mkfile(alias, value["path"], value["mode"],
                                 value["temporary"])
 
-        with self.open(path, "r") as f:
-            fs_struct = json.load(f)
+        with self.open(path, "rb") as f:
+            fs_struct = _load_json(f)
         compose(fs_struct)
 
+    def _iter_structures(self):
+        '''
+        Iterate over the current directory and directories under it, which
+        have structure file. Directories under one without it are skipped.
+
+        @return: Generator of directory and its loaded structure pairs
+        '''
+
+        stack = [self.current_directory]
+        while stack:
+            directory = stack.pop()
+            path = os.path.join(directory.path, ".fs-structure.json")
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                fs_struct = _load_json(f)
+            yield directory, fs_struct
+            stack.extend(value for value in directory.values()
+                         if isinstance(value, AliasedDirectoryObject))
+
+    def _iter_files(self, structures):
+        '''
+        Iterate over files of the directories with loaded structures
+
+        @param structures: Directory and its loaded structure pairs
+        @type structures: `iterable`
+        @return: Generator of file and its structure entry pairs
+        '''
+
+        for directory, fs_struct in structures:
+            for alias, value in directory.items():
+                if isinstance(value, FileObject):
+                    yield value, fs_struct[alias]
+
     def save_hashsums(self, type="md5"):
         '''
         Save file's hashes to .json structure file
@@ -1069,55 +1613,81 @@ class FSManager(object):
         @type type: `str`
         '''
 
-        if self.exists(".fs-structure.json"):
-            current_fs_struct = dict()
-            with self.open(".fs-structure.json", "r") as f:
-                current_fs_struct = json.load(f)
-
-            if type in ["md5", "sha1"]:
-                for alias, value in self.current_directory.iteritems():
-                    if isinstance(value, FileObject):
-                        current_fs_struct[alias][type] = getattr(value, type)()
-                    else:
-                        self.cd(alias)
-                        self.save_hashsums(type)
-                        self.up()
-
-            with self.open(".fs-structure.json", "w") as f:
-                f.write(unicode(json.dumps(current_fs_struct,
-                                           indent=4,
-                                           separators=(',', ':'),
-                                           ensure_ascii=False)))
-
-    def check_hashsums(self, type="md5", log_warnings=True, mismatch=[]):
+        if type not in HASH_TYPES:
+            log.info("Unsupported hashsum method '%s'", type)
+            return
+
+        changed = list()
+        entries = list()
+        files = list()
+        for structure in self._iter_structures():
+            count = len(files)
+            for value, entry in self._iter_files((structure,)):
+                stat_key = _stat_key(value.path)
+                stats = entry.setdefault("stat", dict())
+                # Saved hash sum of the unchanged file is still valid
+                if type in entry and stats.get(type) == stat_key:
+                    continue
+                # Stat is taken before hashing, so a file changed in
+                # between is rehashed next time
+                stats[type] = stat_key
+                entries.append(entry)
+                files.append(value)
+            # Structure without changed files is left as it is on disk
+            if len(files) > count:
+                changed.append(structure)
+
+        # Files of the whole tree share one pool
+        for entry, hashsum in zip(entries, _hash_files(files, type)):
+            entry[type] = hashsum
+
+        for directory, fs_struct in changed:
+            _replace_json(fs_struct,
+                          os.path.join(directory.path, ".fs-structure.json"),
+                          self.pretty_json)
+
+    def check_hashsums(self, type="md5", log_warnings=True, mismatch=None,
+                       full=False):
         '''
         Compare current file hashes to saved in the .json structure file
 
+        Files whose inode, modification time and size are the same as when
+        the hash was saved aren't rehashed, so content rewritten in place
+        with the modification time kept is only caught by the full check
+
         @param type: Hashsum method
         @type type: `str`
         @param log_warnings: Log warnings about mismatch
         @type log_warnings: `bool`
+        @param mismatch: List to append mismatched files to
+        @type mismatch: `list`
+        @param full: Rehash every file regardless of its stat
+        @type full: `bool`
         @return: List of mismatches
         '''
 
-        if self.exists(".fs-structure.json"):
-            loaded_fs_struct = dict()
-            with self.open(".fs-structure.json", "r") as f:
-                loaded_fs_struct = json.load(f)
-
-            if type in ["md5", "sha1"]:
-
-                for alias, value in self.current_directory.iteritems():
-                    if isinstance(value, FileObject):
-                        if loaded_fs_struct[alias][type] != getattr(value,
-                                                                    type)():
-                            if log_warnings:
-                                log.warning("Hashsum mismatch for {}".
-                                            format(value.path))
-                            mismatch.append(value)
-                    else:
-                        self.cd(alias)
-                        self.check_hashsums(type, log_warnings, mismatch)
-                        self.up()
+        if mismatch is None:
+            mismatch = list()
 
+        if type not in HASH_TYPES:
+            log.info("Unsupported hashsum method '%s'", type)
             return mismatch
+
+        saved = list()
+        files = list()
+        for value, entry in self._iter_files(self._iter_structures()):
+            # File isn't rehashed while its stat is the same, unless the
+            # check is full
+            if full or entry.get("stat", dict()).get(type) != \
+                    _stat_key(value.path):
+                saved.append(entry[type])
+                files.append(value)
+
+        for value, saved_hashsum, hashsum in zip(files, saved,
+                                                 _hash_files(files, type)):
+            if saved_hashsum != hashsum:
+                if log_warnings:
+                    log.warning("Hashsum mismatch for %s", value.path)
+                mismatch.append(value)
+
+        return mismatch
@@ -0,0 +1,19 @@
+import tempfile
+import shutil
+import os
+
+# Tests are bound by file system metadata operations, tmpfs keeps them
+# off the disk journal where it's available
+TEST_ROOT = os.environ.get(
+    "FSM_TEST_ROOT", "/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+
+class TempDirMixin(object):
+    def setUp(self):
+        # Tests create resources at relative paths, each one works in its
+        # own directory so they don't collide when run in parallel
+        cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp(prefix="fsm_", dir=TEST_ROOT)
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.tmp)
@@ -1,154 +1,162 @@
-import traceback
 import unittest
+import gc
+import os
 
 from fs_manager import FileObject
 from fs_manager import DirectoryObject
 
+from _support import TempDirMixin
 
-class TestDirectoryAndFile(unittest.TestCase):
+
+class TestDirectoryAndFile(TempDirMixin, unittest.TestCase):
     def test_index_file(self):
-        try:
-            fo = FileObject("test_file", temporary=True)
-            do = DirectoryObject("test_dir", temporary=True)
-            fo.parent = do
-            if do.index(fo) is None:
-                raise Exception("Parent hasn't been set")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test_file", temporary=True)
+        do = DirectoryObject("test_dir", temporary=True)
+        fo.parent = do
+        self.assertIsNotNone(do.index(fo), "Parent hasn't been set")
 
     def test_index_dir(self):
-        try:
-            do1 = DirectoryObject("test_dir1", temporary=True)
-            do2 = DirectoryObject("test_dir2", temporary=True)
-            do1.parent = do2
-            if do2.index(do1) is None:
-                raise Exception("Parent hasn't been set")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do1 = DirectoryObject("test_dir1", temporary=True)
+        do2 = DirectoryObject("test_dir2", temporary=True)
+        do1.parent = do2
+        self.assertIsNotNone(do2.index(do1), "Parent hasn't been set")
 
     def test_index_file_path(self):
-        try:
-            fo = FileObject("test_file", temporary=True)
-            do = DirectoryObject("test_dir", temporary=True)
-            fo.parent = do
-            if do.index(path=fo.path) is None:
-                raise Exception("Parent hasn't been set")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test_file", temporary=True)
+        do = DirectoryObject("test_dir", temporary=True)
+        fo.parent = do
+        self.assertIsNotNone(do.index(path=fo.path), "Parent hasn't been set")
 
     def test_index_dir_path(self):
-        try:
-            do1 = DirectoryObject("test_dir1", temporary=True)
-            do2 = DirectoryObject("test_dir2", temporary=True)
-            do1.parent = do2
-            if do2.index(path=do1.path) is None:
-                raise Exception("Parent hasn't been set")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do1 = DirectoryObject("test_dir1", temporary=True)
+        do2 = DirectoryObject("test_dir2", temporary=True)
+        do1.parent = do2
+        self.assertIsNotNone(do2.index(path=do1.path),
+                             "Parent hasn't been set")
 
     def test_unparent_file(self):
-        try:
-            fo = FileObject("test_file", temporary=True)
-            do = DirectoryObject("test_dir", temporary=True)
-            fo.parent = do
-            fo.unparent()
-            if fo.parent == do or do.index(fo) is not None:
-                raise Exception("Parent hasn't been unset")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test_file", temporary=True)
+        do = DirectoryObject("test_dir", temporary=True)
+        fo.parent = do
+        fo.unparent()
+        self.assertNotEqual(fo.parent, do, "Parent hasn't been unset")
+        self.assertIsNone(do.index(fo), "Parent hasn't been unset")
 
     def test_unparent_dir(self):
-        try:
-            do1 = DirectoryObject("test_dir1", temporary=True)
-            do2 = DirectoryObject("test_dir2", temporary=True)
-            do1.parent = do2
-            do1.unparent()
-            if do1.parent == do2 or do2.index(do1) is not None:
-                raise Exception("Parent hasn't been unset")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do1 = DirectoryObject("test_dir1", temporary=True)
+        do2 = DirectoryObject("test_dir2", temporary=True)
+        do1.parent = do2
+        do1.unparent()
+        self.assertNotEqual(do1.parent, do2, "Parent hasn't been unset")
+        self.assertIsNone(do2.index(do1), "Parent hasn't been unset")
 
     def test_append_file(self):
-        try:
-            fo = FileObject("test_file", temporary=True)
-            do = DirectoryObject("test_dir", temporary=True)
-            do.append(fo)
-            if fo.parent != do or do.index(fo) is None:
-                raise Exception("Parent hasn't been set")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test_file", temporary=True)
+        do = DirectoryObject("test_dir", temporary=True)
+        do.append(fo)
+        self.assertEqual(fo.parent, do, "Parent hasn't been set")
+        self.assertIsNotNone(do.index(fo), "Parent hasn't been set")
 
     def test_append_dir(self):
-        try:
-            do1 = DirectoryObject("test_dir1", temporary=True)
-            do2 = DirectoryObject("test_dir2", temporary=True)
-            do2.append(do1)
-            if do1.parent != do2 or do2.index(do1) is None:
-                raise Exception("Parent hasn't been set")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do1 = DirectoryObject("test_dir1", temporary=True)
+        do2 = DirectoryObject("test_dir2", temporary=True)
+        do2.append(do1)
+        self.assertEqual(do1.parent, do2, "Parent hasn't been set")
+        self.assertIsNotNone(do2.index(do1), "Parent hasn't been set")
 
     def test_insert_file(self):
-        try:
-            fo = FileObject("test_file", temporary=True)
-            do = DirectoryObject("test_dir", temporary=True)
-            do.insert(0, fo)
-            if fo.parent != do or do.index(fo) is None:
-                raise Exception("Parent hasn't been set")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test_file", temporary=True)
+        do = DirectoryObject("test_dir", temporary=True)
+        do.insert(0, fo)
+        self.assertEqual(fo.parent, do, "Parent hasn't been set")
+        self.assertIsNotNone(do.index(fo), "Parent hasn't been set")
 
     def test_insert_dir(self):
-        try:
-            do1 = DirectoryObject("test_dir1", temporary=True)
-            do2 = DirectoryObject("test_dir2", temporary=True)
-            do2.insert(0, do1)
-            if do1.parent != do2 or do2.index(do1) is None:
-                raise Exception("Parent hasn't been set")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do1 = DirectoryObject("test_dir1", temporary=True)
+        do2 = DirectoryObject("test_dir2", temporary=True)
+        do2.insert(0, do1)
+        self.assertEqual(do1.parent, do2, "Parent hasn't been set")
+        self.assertIsNotNone(do2.index(do1), "Parent hasn't been set")
 
     def test_pop_file(self):
-        try:
-            fo = FileObject("test_file", temporary=True)
-            do = DirectoryObject("test_dir", temporary=True)
-            do.append(fo)
-            poped = do.pop(0)
-            if not isinstance(poped, FileObject) and \
-                    not isinstance(poped, DirectoryObject):
-                raise Exception("FileObject/DirectoryObject hasn't "
-                                "been returned as copy")
-            if fo.parent == do or do.index(fo) is not None:
-                raise Exception("Parent hasn't been unset")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test_file", temporary=True)
+        do = DirectoryObject("test_dir", temporary=True)
+        do.append(fo)
+        poped = do.pop(0)
+        self.assertIsInstance(poped, (FileObject, DirectoryObject),
+                              "FileObject/DirectoryObject hasn't "
+                              "been returned as copy")
+        self.assertNotEqual(fo.parent, do, "Parent hasn't been unset")
+        self.assertIsNone(do.index(fo), "Parent hasn't been unset")
 
     def test_pop_dir(self):
-        try:
-            do1 = DirectoryObject("test_dir1", temporary=True)
-            do2 = DirectoryObject("test_dir2", temporary=True)
-            do2.append(do1)
-            poped = do2.pop(0)
-            if not isinstance(poped, FileObject) and \
-                    not isinstance(poped, DirectoryObject):
-                raise Exception("FileObject/DirectoryObject hasn't "
-                                "been returned as copy")
-            if do1.parent == do2 or do2.index(do1) is not None:
-                raise Exception("Parent hasn't been unset")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do1 = DirectoryObject("test_dir1", temporary=True)
+        do2 = DirectoryObject("test_dir2", temporary=True)
+        do2.append(do1)
+        poped = do2.pop(0)
+        self.assertIsInstance(poped, (FileObject, DirectoryObject),
+                              "FileObject/DirectoryObject hasn't "
+                              "been returned as copy")
+        self.assertNotEqual(do1.parent, do2, "Parent hasn't been unset")
+        self.assertIsNone(do2.index(do1), "Parent hasn't been unset")
+
+    def test_index_after_pop(self):
+        with FileObject("test_file1") as fo1, \
+                FileObject("test_file2") as fo2, \
+                DirectoryObject("test_dir") as do:
+            do.append(fo1)
+            do.append(fo2)
+            do.pop(0)
+            self.assertEqual(do.index(fo2), 0, "Wrong index after pop")
+            self.assertEqual(do.index(path=fo2.path), 0,
+                             "Wrong index after pop")
+
+    def test_index_after_move(self):
+        with FileObject("test_file") as fo, \
+                DirectoryObject("test_dir") as do:
+            do.append(fo)
+            fo.move("test_file_moved")
+            self.assertEqual(do.index(path=fo.path), 0,
+                             "Wrong index after move")
+
+    def test_index_after_pop_last(self):
+        with FileObject("test_file1") as fo1, \
+                FileObject("test_file2") as fo2, \
+                DirectoryObject("test_dir") as do:
+            do.append(fo1)
+            do.append(fo2)
+            do.pop(1)
+            self.assertIsNone(do.index(fo2),
+                              "Popped resource is still indexed")
+            self.assertIsNone(do.index(path=fo2.path),
+                              "Popped resource is still indexed")
+            self.assertEqual(do.index(fo1), 0, "Wrong index after pop")
+            do.append(fo2)
+            self.assertEqual(do.index(fo2), 1, "Wrong index after append")
+
+    def test_set_path(self):
+        with FileObject("test_file") as fo, \
+                DirectoryObject("test_dir") as do:
+            do.append(fo)
+            fo.path = "test_file_moved"
+            self.assertTrue(os.path.exists("test_file_moved"),
+                            "File hasn't been moved")
+            self.assertFalse(os.path.exists("test_file"),
+                             "File hasn't been moved")
+            self.assertEqual(fo.file_name, "test_file_moved",
+                             "File hasn't been updated in place")
+            self.assertEqual(len(do), 1, "File hasn't been updated in place")
+
+    def test_del_parented(self):
+        fo = FileObject("test_file", temporary=True)
+        do = DirectoryObject("test_dir", temporary=True)
+        fo.parent = do
+        del fo, do
+        gc.collect()
+        self.assertFalse(os.path.exists("test_file"),
+                         "Temporary resources haven't been removed")
+        self.assertFalse(os.path.exists("test_dir"),
+                         "Temporary resources haven't been removed")
 
 
 if __name__ == "__main__":
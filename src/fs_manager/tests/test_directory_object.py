@@ -1,115 +1,141 @@
-import traceback
 import unittest
+import shutil
 import os
 
 from fs_manager import DirectoryObject
+from fs_manager import FileObject
 
+from _support import TempDirMixin
 
-class TestDirectoryObject(unittest.TestCase):
+
+class TestDirectoryObject(TempDirMixin, unittest.TestCase):
     def test_init(self):
-        try:
-            do = DirectoryObject("test", temporary=True)
-            if not os.path.exists(do.path):
-                raise Exception("Directory has not been initialized")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do = DirectoryObject("test", temporary=True)
+        self.assertTrue(os.path.exists(do.path),
+                        "Directory has not been initialized")
 
     def test_init_from_precreated(self):
-        try:
-            os.mkdir("test")
-            perms = oct(os.stat("test").st_mode & 0o777)
-            do = DirectoryObject("test", temporary=True)
-            if oct(os.stat("test").st_mode & 0o777) != perms:
-                raise Exception("Couldn't init from directory")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        os.mkdir("test")
+        perms = os.stat("test").st_mode & 0o777
+        do = DirectoryObject("test", temporary=True)
+        self.assertEqual(os.stat("test").st_mode & 0o777, perms,
+                         "Couldn't init from directory")
+
+    def test_dir_name_and_path(self):
+        do = DirectoryObject("/tmp")
+        self.assertEqual(do.dir_name, "tmp", "Wrong directory name or path")
+        self.assertEqual(do.dir_path, "/", "Wrong directory name or path")
 
     def test_del(self):
-        try:
-            do = DirectoryObject("test", temporary=True)
-            del do
-            if os.path.exists("test"):
-                raise Exception("Destructor hasn't removed all directories")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do = DirectoryObject("test", temporary=True)
+        del do
+        self.assertFalse(os.path.exists("test"),
+                         "Destructor hasn't removed all directories")
 
     def test_remove(self):
-        try:
-            do = DirectoryObject("test", temporary=True)
-            do.remove()
-            if os.path.exists(do.path):
-                raise Exception("Directory has not been removed")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do = DirectoryObject("test", temporary=True)
+        do.remove()
+        self.assertFalse(os.path.exists(do.path),
+                         "Directory has not been removed")
 
     def test_create(self):
-        try:
-            do = DirectoryObject("test", temporary=True)
-            do.remove()
-            do.create()
-            if not os.path.exists(do.path):
-                raise Exception("Directory has not been created")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do = DirectoryObject("test", temporary=True)
+        do.remove()
+        do.create()
+        self.assertTrue(os.path.exists(do.path),
+                        "Directory has not been created")
 
     def test_move(self):
-        try:
-            do = DirectoryObject("test", temporary=True)
-            do.move("test_move")
-            if not os.path.exists("test_move"):
-                raise Exception("Failed to move")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do = DirectoryObject("test", temporary=True)
+        do.move("test_move")
+        self.assertTrue(os.path.exists("test_move"), "Failed to move")
 
     def test_copy(self):
-        try:
-            do = DirectoryObject("test", temporary=True)
-            do_copy = do.copy("test_copy")
-            if not isinstance(do_copy, DirectoryObject):
-                raise Exception("DirectoryObject hasn't been returned as copy")
-            if not os.path.exists("test_copy"):
-                raise Exception("Failed to copy")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do = DirectoryObject("test", temporary=True)
+        do_copy = do.copy("test_copy")
+        self.assertIsInstance(do_copy, DirectoryObject,
+                              "DirectoryObject hasn't been returned as copy")
+        self.assertTrue(os.path.exists("test_copy"), "Failed to copy")
+
+    def test_slots(self):
+        do = DirectoryObject("test", temporary=True)
+        self.assertFalse(hasattr(do, "__dict__"),
+                         "DirectoryObject has instance dictionary")
+
+    def test_copy_content(self):
+        with DirectoryObject("test") as do:
+            with open("test/test1", "wb") as f:
+                f.write(b"rambo test" * 10000)
+            with do.copy("test_copy") as do_copy:
+                with open(os.path.join(do_copy.path, "test1"),
+                          "rb") as f:
+                    self.assertEqual(f.read(), b"rambo test" * 10000,
+                                     "Content hasn't been copied")
+
+    @unittest.skipUnless(os.path.exists("/proc/version"),
+                         "procfs isn't mounted")
+    def test_copy_short_stat(self):
+        # Symlink is followed by copytree, procfs reports zero size for
+        # files that have content
+        with DirectoryObject("test") as do:
+            os.symlink("/proc/version", "test/version")
+            with do.copy("test_copy") as do_copy, \
+                    open("/proc/version", "rb") as f, \
+                    open(os.path.join(do_copy.path, "version"),
+                         "rb") as f_copy:
+                self.assertEqual(f_copy.read(), f.read(),
+                                 "Content hasn't been copied")
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "FIFOs aren't supported")
+    def test_copy_fifo(self):
+        # Opening FIFO for reading blocks until there is a writer
+        do = DirectoryObject("test", temporary=True)
+        os.mkfifo("test/pipe")
+        with self.assertRaises(shutil.Error):
+            do.copy("test_copy")
 
     def test_chmod(self):
+        do = DirectoryObject("test", temporary=True)
+        do.chmod(0o644)
+        self.assertEqual(os.stat(do.path).st_mode & 0o777, 0o644,
+                         "Wrong mode of moved directory")
+
+    def test_mode(self):
+        umask = os.umask(0o022)
         try:
-            do = DirectoryObject("test", temporary=True)
-            do.chmod(0o644)
-            if oct(os.stat(do.path).st_mode & 0o777) != oct(0o644):
-                raise Exception("Wrong mode of moved directory")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+            do = DirectoryObject("test", 0o777, temporary=True)
+        finally:
+            os.umask(umask)
+        self.assertEqual(do.mode, 0o755, "Wrong mode of created directory")
+        do.chmod(0o700)
+        self.assertEqual(do.mode, 0o700, "Wrong mode of changed directory")
 
     def test_move_chmod(self):
-        try:
-            do = DirectoryObject("test", temporary=True)
-            do.move("test_move")
-            do.chmod(0o644)
-            if oct(os.stat(do.path).st_mode & 0o777) != oct(0o644):
-                raise Exception("Wrong mode of moved directory")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do = DirectoryObject("test", temporary=True)
+        do.move("test_move")
+        do.chmod(0o644)
+        self.assertEqual(os.stat(do.path).st_mode & 0o777, 0o644,
+                         "Wrong mode of moved directory")
 
     def test_copy_chmod(self):
-        try:
-            do = DirectoryObject("test", temporary=True)
-            do_copy = do.copy("test_copy")
-            do_copy.chmod(0o644)
-            if oct(os.stat(do_copy.path).st_mode & 0o777) != oct(0o644):
-                raise Exception("Wrong mode of copied directory")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        do = DirectoryObject("test", temporary=True)
+        do_copy = do.copy("test_copy")
+        do_copy.chmod(0o644)
+        self.assertEqual(os.stat(do_copy.path).st_mode & 0o777,
+                         0o644,
+                         "Wrong mode of copied directory")
+
+    def test_hash_all(self):
+        with DirectoryObject("test") as do:
+            fo1 = FileObject("test/test1", parent=do)
+            fo2 = FileObject("test/test2", parent=do)
+            with open(fo2.path, "w") as f:
+                f.write("rambo test")
+            DirectoryObject("test/test3", parent=do)
+            hashes = do.hash_all("md5")
+            self.assertEqual(hashes,
+                             {fo1.path: fo1.md5(), fo2.path: fo2.md5()},
+                             "Wrong hash sums of directory files")
 
 
 if __name__ == "__main__":
@@ -1,116 +1,236 @@
-import traceback
 import unittest
+from unittest import mock
+import shutil
+import hashlib
+import mmap
 import os
 
 from fs_manager import FileObject
 
+from _support import TempDirMixin
 
-class TestFileObject(unittest.TestCase):
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+class TestFileObject(TempDirMixin, unittest.TestCase):
     def test_init(self):
-        try:
-            fo = FileObject("test", temporary=True)
-            if not os.path.exists(fo.path):
-                raise Exception("File has not been initialized")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test", temporary=True)
+        self.assertTrue(os.path.exists(fo.path),
+                        "File has not been initialized")
+
+    def test_eq(self):
+        fo = FileObject("test", temporary=True)
+        self.assertEqual(fo, FileObject("test"), "Same file isn't equal")
+        with self.assertRaises(TypeError):
+            hash(fo)
 
     def test_init_from_precreated(self):
-        try:
-            with open("test", "w") as f:
-                f.write("rambo test")
-            perms = oct(os.stat("test").st_mode & 0o777)
-            fo = FileObject("test", temporary=True)
-            if oct(os.stat("test").st_mode & 0o777) != perms:
-                raise Exception("Couldn't init from file")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        with open("test", "w") as f:
+            f.write("rambo test")
+        perms = os.stat("test").st_mode & 0o777
+        fo = FileObject("test", temporary=True)
+        self.assertEqual(os.stat("test").st_mode & 0o777, perms,
+                         "Couldn't init from file")
+
+    def test_file_name_and_path(self):
+        fo = FileObject("test", temporary=True)
+        self.assertEqual(fo.file_name, "test", "Wrong file name or path")
+        self.assertEqual(fo.file_path, os.getcwd(), "Wrong file name or path")
+
+    def test_slots(self):
+        fo = FileObject("test", temporary=True)
+        self.assertFalse(hasattr(fo, "__dict__"),
+                         "FileObject has instance dictionary")
 
     def test_del(self):
-        try:
-            fo = FileObject("test", temporary=True)
-            del fo
-            if os.path.exists("test"):
-                raise Exception("Destructor hasn't removed all files")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test", temporary=True)
+        del fo
+        self.assertFalse(os.path.exists("test"),
+                         "Destructor hasn't removed all files")
 
     def test_remove(self):
-        try:
-            fo = FileObject("test", temporary=True)
-            fo.remove()
-            if os.path.exists(fo.path):
-                raise Exception("File has not been removed")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test", temporary=True)
+        fo.remove()
+        self.assertFalse(os.path.exists(fo.path), "File has not been removed")
 
     def test_create(self):
+        fo = FileObject("test", temporary=True)
+        fo.remove()
+        fo.create()
+        self.assertTrue(os.path.exists(fo.path), "File has not been created")
+
+    def test_create_mode(self):
+        umask = os.umask(0o077)
         try:
-            fo = FileObject("test", temporary=True)
-            fo.remove()
-            fo.create()
-            if not os.path.exists(fo.path):
-                raise Exception("File has not been created")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+            fo = FileObject("test", 0o644, temporary=True)
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(fo.path).st_mode & 0o777, 0o644,
+                         "Umask has been applied to file mode")
 
     def test_move(self):
-        try:
-            fo = FileObject("test", temporary=True)
-            fo.move("test_move")
-            if not os.path.exists("test_move"):
-                raise Exception("Failed to move")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test", temporary=True)
+        fo.move("test_move")
+        self.assertTrue(os.path.exists("test_move"), "Failed to move")
 
     def test_copy(self):
-        try:
-            fo = FileObject("test", temporary=True)
-            fo_copy = fo.copy("test_copy")
-            if not isinstance(fo_copy, FileObject):
-                raise Exception("FileObject hasn't been returned as copy")
-            if not os.path.exists("test_copy"):
-                raise Exception("Failed to copy")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test", temporary=True)
+        fo_copy = fo.copy("test_copy")
+        self.assertIsInstance(fo_copy, FileObject,
+                              "FileObject hasn't been returned as copy")
+        self.assertTrue(os.path.exists("test_copy"), "Failed to copy")
+
+    def test_copy_content(self):
+        fo = FileObject("test", 0o640, temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test" * 10000)
+        fo_copy = fo.copy("test_copy")
+        with open(fo_copy.path, "rb") as f:
+            self.assertEqual(f.read(), b"rambo test" * 10000,
+                             "Content hasn't been copied")
+        self.assertEqual(fo_copy.mode, 0o640, "Mode hasn't been copied")
+
+    def test_copy_same_file(self):
+        fo = FileObject("test", temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test")
+        with self.assertRaises(shutil.SameFileError):
+            fo.copy("test")
+        with open(fo.path, "rb") as f:
+            self.assertEqual(f.read(), b"rambo test",
+                             "Content has been lost")
+
+    def test_copy_hard_link(self):
+        fo = FileObject("test", temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test")
+        os.link("test", "test_link")
+        with self.assertRaises(shutil.SameFileError):
+            fo.copy("test_link")
+        with open(fo.path, "rb") as f:
+            self.assertEqual(f.read(), b"rambo test",
+                             "Content has been lost")
+
+    @unittest.skipUnless(os.path.exists("/proc/version"),
+                         "procfs isn't mounted")
+    def test_copy_short_stat(self):
+        # procfs reports zero size for files that have content
+        fo = FileObject("/proc/version")
+        fo_copy = fo.copy("test_copy")
+        with open(fo.path, "rb") as f, open(fo_copy.path, "rb") as f_copy:
+            content = f.read()
+            self.assertTrue(content, "Source file is empty")
+            self.assertEqual(f_copy.read(), content,
+                             "Content hasn't been copied")
 
     def test_chmod(self):
-        try:
-            fo = FileObject("test", temporary=True)
-            fo.chmod(0o644)
-            if oct(os.stat(fo.path).st_mode & 0o777) != oct(0o644):
-                raise Exception("Wrong mode of file")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test", temporary=True)
+        fo.chmod(0o644)
+        self.assertEqual(os.stat(fo.path).st_mode & 0o777, 0o644,
+                         "Wrong mode of file")
 
     def test_move_chmod(self):
-        try:
-            fo = FileObject("test", temporary=True)
-            fo.move("test_move")
-            fo.chmod(0o644)
-            if oct(os.stat(fo.path).st_mode & 0o777) != oct(0o644):
-                raise Exception("Wrong mode of moved file")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test", temporary=True)
+        fo.move("test_move")
+        fo.chmod(0o644)
+        self.assertEqual(os.stat(fo.path).st_mode & 0o777, 0o644,
+                         "Wrong mode of moved file")
 
     def test_copy_chmod(self):
-        try:
-            fo = FileObject("test", temporary=True)
-            fo_copy = fo.copy("test_copy")
-            fo_copy.chmod(0o644)
-            if oct(os.stat(fo_copy.path).st_mode & 0o777) != oct(0o644):
-                raise Exception("Wrong mode of copied file")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fo = FileObject("test", temporary=True)
+        fo_copy = fo.copy("test_copy")
+        fo_copy.chmod(0o644)
+        self.assertEqual(os.stat(fo_copy.path).st_mode & 0o777,
+                         0o644,
+                         "Wrong mode of copied file")
+
+    def test_md5(self):
+        fo = FileObject("test", temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test" * 10000)
+        self.assertEqual(fo.md5(),
+                         hashlib.md5(b"rambo test" * 10000).hexdigest(),
+                         "Wrong md5 hash sum")
+
+    def test_md5_small(self):
+        fo = FileObject("test", temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test")
+        self.assertEqual(fo.md5(), hashlib.md5(b"rambo test").hexdigest(),
+                         "Wrong md5 hash sum of small file")
+
+    def test_sha1(self):
+        fo = FileObject("test", temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test" * 10000)
+        self.assertEqual(fo.sha1(),
+                         hashlib.sha1(b"rambo test" * 10000).hexdigest(),
+                         "Wrong sha1 hash sum")
+
+    def test_sha256(self):
+        fo = FileObject("test", temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test" * 10000)
+        self.assertEqual(fo.sha256(),
+                         hashlib.sha256(b"rambo test" * 10000).hexdigest(),
+                         "Wrong sha256 hash sum")
+
+    @unittest.skipIf(blake3 is None, "blake3 isn't installed")
+    def test_blake3(self):
+        fo = FileObject("test", temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test" * 200000)
+        self.assertEqual(fo.blake3(),
+                         blake3.blake3(b"rambo test" * 200000).hexdigest(),
+                         "Wrong BLAKE3 hash sum")
+
+    @unittest.skipIf(xxhash is None, "xxhash isn't installed")
+    def test_xxh3(self):
+        fo = FileObject("test", temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test" * 10000)
+        self.assertEqual(fo.xxh3(),
+                         xxhash.xxh3_64(b"rambo test" * 10000).hexdigest(),
+                         "Wrong XXH3 hash sum")
+
+    def test_sha1_large(self):
+        fo = FileObject("test", temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test" * 200000)
+        self.assertEqual(fo.sha1(),
+                         hashlib.sha1(b"rambo test" * 200000).hexdigest(),
+                         "Wrong sha1 hash sum of large file")
+
+    def test_sha1_unmappable(self):
+        fo = FileObject("test", temporary=True)
+        with open(fo.path, "wb") as f:
+            f.write(b"rambo test" * 200000)
+        with mock.patch.object(mmap, "mmap", side_effect=ValueError):
+            self.assertEqual(fo.sha1(),
+                             hashlib.sha1(b"rambo test" * 200000).hexdigest(),
+                             "Wrong sha1 hash sum of unmappable file")
+
+    def test_hash_from(self):
+        header = b"rambo header" * 100
+        hash_sum = hashlib.sha1(header)
+        for body in (b"rambo test" * 10, b"rambo test" * 200000):
+            with FileObject("test") as fo:
+                with open(fo.path, "wb") as f:
+                    f.write(header + body)
+                self.assertEqual(fo.hash_from(hash_sum, len(header)),
+                                 hashlib.sha1(header + body).hexdigest(),
+                                 "Wrong hash sum from seeded hash")
+        self.assertEqual(hash_sum.hexdigest(),
+                         hashlib.sha1(header).hexdigest(),
+                         "Seeded hash has been changed")
 
 
 if __name__ == "__main__":
@@ -1,504 +1,476 @@
-import traceback
 import unittest
 import os
 import shutil
 import json
+import hashlib
+import tempfile
+import itertools
 
 from fs_manager import FSManager
 
+from _support import TEST_ROOT
+
+
+def _rmtree(path):
+    # rmtree walks with scandir and directory fds, removing a tree costs
+    # one getdents per directory and no stat per entry
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _mode(path):
+    return os.stat(path).st_mode & 0o777
+
 
 class TestFSManager(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Temporary managers of all the tests share one base directory
+        cls.base_path = tempfile.mkdtemp(prefix="fsm_", dir=TEST_ROOT)
+
+        # Tree and its structure files are built once, tests loading them
+        # get a copy of the tree or bytes of the full structure
+        cls.golden_path = os.path.join(cls.base_path, "golden")
+        with FSManager(base_path=cls.golden_path,
+                       mode=0o744, temporary=False) as fsm:
+            fsm.mkdir("test1")
+            fsm.mkfile("test1/test11")
+            fsm.mkdir("test2/test22")
+            fsm.cd("test2/test22")
+            fsm.mkfile("test222")
+            fsm.save_all()
+        with open(os.path.join(cls.golden_path, ".fs-structure-full.json"),
+                  "rb") as f:
+            cls.golden_json = f.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        _rmtree(cls.base_path)
+
+    def setUp(self):
+        # Every test gets its own directory, so tests don't see leftovers
+        # of each other and can run in parallel
+        self.tmp = tempfile.mkdtemp(dir=self.base_path)
+        self.addCleanup(_rmtree, self.tmp)
+
+    def _tmp(self, path):
+        return os.path.join(self.tmp, path)
+
+    def _makedirs(self, *paths):
+        # Leaves only, their parents are made along the way
+        for path in paths:
+            os.makedirs(self._tmp(path), exist_ok=True)
+
+    def _fsm(self):
+        # Temporary manager is removed right after the test
+        fsm = FSManager(base_path=self.base_path, temporary=True)
+        self.addCleanup(fsm.close)
+        return fsm
+
     def test_init(self):
-        try:
-            fsm = FSManager(temporary=True)
-            if not os.path.exists(fsm.prefix_path):
-                raise Exception("FSManager hasn't been initialized")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-
-    def test_del(self):
-        try:
-            fsm = FSManager(temporary=True)
-            prefix_path = fsm.prefix_path
-            del fsm
-            if os.path.exists(prefix_path):
-                raise Exception("Destructor hasn't remove all files")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        self.assertTrue(os.path.exists(fsm.prefix_path),
+                        "FSManager hasn't been initialized")
+
+    def test_close(self):
+        fsm = FSManager(base_path=self.base_path, temporary=True)
+        fsm.close()
+        self.assertFalse(os.path.exists(fsm.prefix_path),
+                         "Close hasn't removed all files")
 
     def test_init_from_precreated(self):
-        try:
-            precreated = "/tmp/precreated"
-            os.mkdir(precreated)
-            fsm = FSManager(precreated, 0o744, temporary=True)
-            if oct(os.stat(precreated).st_mode & 0o777) != oct(0o744):
-                raise Exception("Failed to initialize from pre-created")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-        finally:
-            shutil.rmtree(precreated)
+        precreated = self._tmp("precreated")
+        os.mkdir(precreated)
+        fsm = FSManager(precreated, 0o744, temporary=True)
+        self.assertEqual(_mode(precreated), 0o744,
+                         "Failed to initialize from pre-created")
 
     def test_mkfile(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkfile("test/test1")
-            if not os.path.exists(os.path.join(fsm.prefix_path, "test")):
-                raise Exception("File hasn't been created")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkfile("test/test1")
+        self.assertTrue(os.path.exists(os.path.join(fsm.prefix_path, "test")),
+                        "File hasn't been created")
 
     def test_mkdir(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir("test/test1")
-            if not os.path.exists(os.path.join(fsm.prefix_path, "test")):
-                raise Exception("File hasn't been created")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkdir("test/test1")
+        self.assertTrue(os.path.exists(os.path.join(fsm.prefix_path, "test")),
+                        "File hasn't been created")
 
     def test_file(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkfile(alias="rambo", path="test/test1")
-            if fsm.file("rambo") is None:
-                raise Exception("Couldn't find a file")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkfile(alias="rambo", path="test/test1")
+        self.assertIsNotNone(fsm.file("rambo"), "Couldn't find a file")
 
     def test_dir(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir(alias="rambo", path="test/test1")
-            if fsm.dir("rambo") is None:
-                raise Exception("Couldn't find a directory")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkdir(alias="rambo", path="test/test1")
+        self.assertIsNotNone(fsm.dir("rambo"), "Couldn't find a directory")
 
     def test_open(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkfile(alias="rambo", path="test/test1")
-            with fsm.open("rambo", "w") as f:
-                f.write("rambo test")
-            with open(fsm.file("rambo").path) as f:
-                if f.readline() != "rambo test":
-                    raise Exception("Couldn't write to file")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkfile(alias="rambo", path="test/test1")
+        with fsm.open("rambo", "w") as f:
+            f.write("rambo test")
+        with open(fsm.file("rambo").path) as f:
+            self.assertEqual(f.readline(), "rambo test",
+                             "Couldn't write to file")
 
     def test_remove(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir("test1/test2")
-            fsm.mkfile("test3/test4/test_file")
-            fsm.remove()
-            if os.path.exists(fsm.prefix_path):
-                raise Exception("Couldn't remove all resources under prefix")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkdir("test1/test2")
+        fsm.mkfile("test3/test4/test_file")
+        fsm.remove()
+        self.assertFalse(os.path.exists(fsm.prefix_path),
+                         "Couldn't remove all resources under prefix")
+
+    def test_mkfile_after_remove(self):
+        fsm = self._fsm()
+        fsm.mkfile("test1")
+        fsm.remove()
+        fsm.mkfile("test2")
+        self.assertTrue(os.path.exists(os.path.join(fsm.prefix_path,
+                                                    "test2")),
+                        "Prefix hasn't been recreated")
 
     def test_exists(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir("test1/test2")
-            if os.path.exists(fsm.dir("test1/test2").path) != \
-                    fsm.exists("test1/test2"):
-                raise Exception("Exists at relative doesn't work")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkdir("test1/test2")
+        self.assertEqual(os.path.exists(fsm.dir("test1/test2").path),
+                         fsm.exists("test1/test2"),
+                         "Exists at relative doesn't work")
+
+    def test_abspath(self):
+        fsm = self._fsm()
+        self.assertEqual(fsm.abspath("test1/../test2"),
+                         os.path.join(fsm.prefix_path, "test2"),
+                         "Wrong absolute path for relative one")
+        self.assertEqual(fsm.abspath("/tmp/../test"), "/test",
+                         "Wrong absolute path for absolute one")
+
+    def test_abspath_after_cd(self):
+        fsm = self._fsm()
+        fsm.mkdir("rambo", "test1")
+        fsm.cd("rambo")
+        self.assertEqual(fsm.abspath("test2"),
+                         os.path.join(fsm.root_directory.path,
+                                      "test1", "test2"),
+                         "Absolute path doesn't follow prefix")
+        fsm.up()
+        self.assertEqual(fsm.abspath("test2"),
+                         os.path.join(fsm.root_directory.path, "test2"),
+                         "Absolute path doesn't follow prefix")
 
     def test_chmod_file(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkfile("rambo", "test1/test2/test3")
-            fsm.chmod("rambo", 0o644)
-            if oct(os.stat(fsm.file("rambo").path).
-                   st_mode & 0o777) != oct(0o644):
-                raise Exception("Wrong mode of file")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkfile("rambo", "test1/test2/test3")
+        fsm.chmod("rambo", 0o644)
+        self.assertEqual(_mode(fsm.file("rambo").path), 0o644,
+                         "Wrong mode of file")
 
     def test_chmod_dir(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir("rambo", "test1/test2/test3")
-            fsm.chmod("rambo", 0o644)
-            if oct(os.stat(fsm.dir("rambo").path).
-                   st_mode & 0o777) != oct(0o644):
-                raise Exception("Wrong mode of directory")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkdir("rambo", "test1/test2/test3")
+        fsm.chmod("rambo", 0o644)
+        self.assertEqual(_mode(fsm.dir("rambo").path), 0o644,
+                         "Wrong mode of directory")
 
     def test_rm_file(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkfile("rambo", "test1/test2/test3")
-            fsm.rm("rambo")
-            fsm.ls()
-            if fsm.exists("test1/test2/test3"):
-                raise Exception("File hasn't been removed")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkfile("rambo", "test1/test2/test3")
+        fsm.rm("rambo")
+        fsm.ls()
+        self.assertFalse(fsm.exists("test1/test2/test3"),
+                         "File hasn't been removed")
 
     def test_rm_dir(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir("rambo", "test1/test2/test3")
-            fsm.rm("rambo")
-            fsm.ls()
-            if fsm.exists("test1/test2/test3"):
-                raise Exception("Directory hasn't been removed")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-
-    def test_cp_file_alias(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkfile("rambo", "test1/test2/test3")
-            fsm.cp("rambo", "test1/test22/test33")
-            if not (fsm.file("test1/test22/test33") is not None and
-                    fsm.exists("test1/test22/test33")):
-                raise Exception("File hasn't been copied")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-
-    def test_cp_dir_alias(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir("rambo", "test1/test2/test3")
-            fsm.cp("rambo", "test1/test22/test33")
-            if not (fsm.dir("test1/test22/test33") is not None and
-                    fsm.exists("test1/test22/test33")):
-                raise Exception("Directory hasn't been copied")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-
-    def test_cp_file_path(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkfile("rambo", "test1/test2/test3")
-            fsm.cp("rambo", "mambo", "test1/test22/test33")
-            if not (fsm.file("mambo") is not None and
-                    os.path.exists(os.path.join(fsm.prefix_path,
-                                                "test1/test22/test33"))):
-                raise Exception("File hasn't been copied")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-
-    def test_cp_dir_path(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir("rambo", "test1/test2/test3")
-            fsm.cp("rambo", "mambo", "test1/test22/test33")
-            if not (fsm.dir("mambo") is not None and
-                    os.path.exists(os.path.join(fsm.prefix_path,
-                                                "test1/test22/test33"))):
-                raise Exception("Directory hasn't been copied")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-
-    def test_mv_file_alias(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkfile("rambo", "test1/test2/test3")
-            fsm.mv("rambo", "test1/test22/test33")
-            if not (fsm.file("test1/test22/test33") is not None and
-                    fsm.exists("test1/test22/test33")):
-                raise Exception("File hasn't been moved")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-
-    def test_mv_dir_alias(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir("rambo", "test1/test2/test3")
-            fsm.mv("rambo", "test1/test22/test33")
-            if not (fsm.dir("test1/test22/test33") is not None and
-                    fsm.exists("test1/test22/test33")):
-                raise Exception("Directory hasn't been moved")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-
-    def test_mv_file_path(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkfile("rambo", "test1/test2/test3")
-            fsm.mv("rambo", "mambo", "test1/test22/test33")
-            if not (fsm.file("mambo") is not None and
-                    os.path.exists(os.path.join(fsm.prefix_path,
-                                                "test1/test22/test33"))):
-                raise Exception("File hasn't been moved")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-
-    def test_mv_dir_path(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir("rambo", "test1/test2/test3")
-            fsm.mv("rambo", "mambo", "test1/test22/test33")
-            if not (fsm.dir("mambo") is not None and
-                    os.path.exists(os.path.join(fsm.prefix_path,
-                                                "test1/test22/test33"))):
-                raise Exception("Directory hasn't been moved")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkdir("rambo", "test1/test2/test3")
+        fsm.rm("rambo")
+        fsm.ls()
+        self.assertFalse(fsm.exists("test1/test2/test3"),
+                         "Directory hasn't been removed")
+
+    def test_cp_mv(self):
+        # Every case works in its own subdirectory of one manager
+        fsm = self._fsm()
+        ops = (("cp", "copied"), ("mv", "moved"))
+        kinds = (("File", fsm.mkfile, fsm.file),
+                 ("Directory", fsm.mkdir, fsm.dir))
+        for (op, done), (kind, make, lookup), by_path in \
+                itertools.product(ops, kinds, (False, True)):
+            with self.subTest(op=op, kind=kind, by_path=by_path):
+                case = "%s_%s_%d" % (op, kind, by_path)
+                msg = "%s hasn't been %s" % (kind, done)
+                make(case, os.path.join(case, "test1/test2/test3"))
+                path = os.path.join(case, "test1/test22/test33")
+                if by_path:
+                    getattr(fsm, op)(case, case + "_dst", path)
+                    self.assertIsNotNone(lookup(case + "_dst"), msg)
+                    self.assertTrue(os.path.exists(
+                        os.path.join(fsm.prefix_path, path)), msg)
+                else:
+                    getattr(fsm, op)(case, path)
+                    self.assertIsNotNone(lookup(path), msg)
+                    self.assertTrue(fsm.exists(path), msg)
 
     def test_chalias(self):
-        try:
-            fsm = FSManager(temporary=True)
-            fsm.mkdir("rambo", "test1/test2/test3")
-            fsm.chalias("rambo", "mambo")
-            if not (fsm.dir("mambo") is not None and
-                    os.path.exists(os.path.join(fsm.prefix_path,
-                                                "test1/test2/test3"))):
-                raise Exception("Error occurred while changing alias")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
+        fsm = self._fsm()
+        fsm.mkdir("rambo", "test1/test2/test3")
+        fsm.chalias("rambo", "mambo")
+        self.assertIsNotNone(fsm.dir("mambo"),
+                             "Error occurred while changing alias")
+        self.assertTrue(os.path.exists(os.path.join(fsm.prefix_path,
+                                                    "test1/test2/test3")),
+                        "Error occurred while changing alias")
 
     def test_small_manipulations(self):
-        try:
-            os.mkdir("/tmp/fsm_tests/")
-            with FSManager(base_path="/tmp/fsm_tests/small_manipulations",
-                           mode=0o744, temporary=False) as fsm:
-                fsm.mkdir("rambo", "rambo_dir", 0o744, False)
-                fsm.cd("rambo")
-                fsm.mkfile("rambo", "rambo_file", True)
-                fsm.ls()
-                fsm.back()
-                fsm.ls()
-                fsm.rm("rambo")
-                if os.path.exists(os.path.join("/tmp/fsm_tests/"
-                                               "small_manipulations",
-                                               "rambo_dir")):
-                    raise Exception("Failed to remove directory")
-                fsm.mkdir("rambo_dir")
-            if not os.path.exists(os.path.join("/tmp/fsm_tests/"
-                                               "small_manipulations",
-                                               "rambo_dir")):
-                raise Exception("Directory has been deleted")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-        finally:
-            try:
-                shutil.rmtree("/tmp/fsm_tests", ignore_errors=True)
-            except:
-                pass
+        base_path = self._tmp("small_manipulations")
+        with FSManager(base_path=base_path,
+                       mode=0o744, temporary=False) as fsm:
+            fsm.mkdir("rambo", "rambo_dir", 0o744, False)
+            fsm.cd("rambo")
+            fsm.mkfile("rambo", "rambo_file", True)
+            fsm.ls()
+            fsm.back()
+            fsm.ls()
+            fsm.rm("rambo")
+            self.assertNotIn("rambo_dir", os.listdir(base_path),
+                             "Failed to remove directory")
+            fsm.mkdir("rambo_dir")
+        # One directory read checks the whole resulting listing
+        self.assertEqual(set(os.listdir(base_path)),
+                         {"rambo_dir", ".fs-structure.json"},
+                         "Wrong resources are left after manipulations")
 
     def test_save(self):
-        try:
-            os.mkdir("/tmp/fsm_tests/")
-            with FSManager(base_path="/tmp/fsm_tests/save_test",
-                           mode=0o744, temporary=False) as fsm:
-                fsm.mkdir("test1")
-                fsm.cd("test1")
-                fsm.mkfile("test11")
-            if not os.path.exists("/tmp/fsm_tests/"
-                                  "save_test/.fs-structure.json"):
-                raise Exception("Save of structure failed")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-        finally:
-            try:
-                shutil.rmtree("/tmp/fsm_tests", ignore_errors=True)
-            except:
-                pass
+        with FSManager(base_path=self._tmp("save_test"),
+                       mode=0o744, temporary=False) as fsm:
+            fsm.mkdir("test1")
+            fsm.cd("test1")
+            fsm.mkfile("test11")
+        self.assertTrue(
+            os.path.exists(self._tmp("save_test/.fs-structure.json")),
+            "Save of structure failed")
 
     def test_load(self):
-        try:
-            os.mkdir("/tmp/fsm_tests/")
-            with FSManager(base_path="/tmp/fsm_tests/load_test",
-                           mode=0o744, temporary=False) as fsm:
-                fsm.mkdir("test1")
-                fsm.cd("test1")
-                fsm.mkdir("test11")
-                fsm.cd("test11")
-                fsm.mkfile("test111")
-                fsm.cd_root()
-                fsm.mkdir("test2")
-                fsm.mkfile("test2/test22")
-            with FSManager(base_path="/tmp/fsm_tests/load_test",
-                           mode=0o744, temporary=False) as fsm:
-                if fsm.file("test2/test22") is None:
-                    raise Exception("Can't load structure")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-        finally:
-            try:
-                shutil.rmtree("/tmp/fsm_tests", ignore_errors=True)
-            except:
-                pass
+        # Structure files are rewritten in place on load, so the tree is
+        # copied rather than hard-linked
+        shutil.copytree(self.golden_path, self._tmp("load_test"))
+        with FSManager(base_path=self._tmp("load_test"),
+                       mode=0o744, temporary=False) as fsm:
+            self.assertIsNotNone(fsm.file("test1/test11"),
+                                 "Can't load structure")
+            self.assertIsNotNone(fsm.dir("test2/test22"),
+                                 "Can't load structure")
 
     def test_snappy(self):
-        try:
-            os.mkdir("/tmp/fsm_tests/")
-            os.makedirs("/tmp/fsm_tests/rules/plague")
-            os.makedirs("/tmp/fsm_tests/water/fire")
-            with open("/tmp/fsm_tests/water/fire/stone", "w") as f:
-                f.write("stone")
-            with FSManager(base_path="/tmp/fsm_tests/",
-                           mode=0o744, temporary=False) as fsm:
-                fsm.snappy()
-                fsm.cd("water")
-                fsm.cd("fire")
-                if fsm.file("stone") is None:
-                    raise Exception("Snappy doesn't work")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-        finally:
-            try:
-                shutil.rmtree("/tmp/fsm_tests", ignore_errors=True)
-            except:
-                pass
+        self._makedirs("rules/plague", "water/fire")
+        with open(self._tmp("water/fire/stone"), "w") as f:
+            f.write("stone")
+        with FSManager(base_path=self.tmp,
+                       mode=0o744, temporary=False) as fsm:
+            fsm.snappy()
+            fsm.cd("water")
+            fsm.cd("fire")
+            self.assertIsNotNone(fsm.file("stone"), "Snappy doesn't work")
+
+    def test_snappy_nested(self):
+        self._makedirs("rules/plague", "water/fire")
+        with FSManager(base_path=self.tmp,
+                       mode=0o744, temporary=False) as fsm:
+            fsm.snappy()
+            self.assertIs(fsm.current_directory, fsm.root_directory,
+                          "Snappy has changed current directory")
+            fsm.cd("rules")
+            self.assertIsNotNone(fsm.dir("plague"),
+                                 "Snappy has built wrong structure")
+            self.assertIsNone(fsm.dir("fire"),
+                              "Snappy has built wrong structure")
 
     def test_snappy_root_binded(self):
-        try:
-            os.mkdir("/tmp/fsm_tests/")
-            os.makedirs("/tmp/fsm_tests/rules/plague")
-            os.makedirs("/tmp/fsm_tests/water/fire")
-            with open("/tmp/fsm_tests/water/fire/stone", "w") as f:
-                f.write("stone")
-            with FSManager(base_path="/tmp/fsm_tests/",
-                           mode=0o744, temporary=False) as fsm:
-                fsm.snappy(True)
-                if fsm.file("water/fire/stone") is None:
-                    raise Exception("Snappy doesn't work")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-        finally:
-            try:
-                shutil.rmtree("/tmp/fsm_tests", ignore_errors=True)
-            except:
-                pass
+        self._makedirs("rules/plague", "water/fire")
+        with open(self._tmp("water/fire/stone"), "w") as f:
+            f.write("stone")
+        with FSManager(base_path=self.tmp,
+                       mode=0o744, temporary=False) as fsm:
+            fsm.snappy(True)
+            self.assertIsNotNone(fsm.file("water/fire/stone"),
+                                 "Snappy doesn't work")
 
     def test_save_all(self):
-        try:
-            os.mkdir("/tmp/fsm_tests/")
-            with FSManager(base_path="/tmp/fsm_tests/",
-                           mode=0o744, temporary=False) as fsm:
-                fsm.mkdir("test1")
-                fsm.mkfile("test1/test11")
-                fsm.mkdir("test2/test22")
-                fsm.cd("test2/test22")
-                fsm.mkfile("test222")
+        with FSManager(base_path=self.tmp,
+                       mode=0o744, temporary=False) as fsm:
+            fsm.mkdir("test1")
+            fsm.mkfile("test1/test11")
+            fsm.mkdir("test2/test22")
+            fsm.cd("test2/test22")
+            fsm.mkfile("test222")
+            fsm.save_all()
+            self.assertIsNotNone(fsm.file("test222"),
+                                 "Current directory has been changed")
+        self.assertTrue(os.path.exists(self._tmp(".fs-structure-full.json")),
+                        "Failed to save full structure")
+
+    def test_save_all_replace(self):
+        with FSManager(base_path=self.tmp,
+                       mode=0o744, temporary=False) as fsm:
+            fsm.mkfile("test1")
+            fsm.save_all()
+            os.chmod(self._tmp(".fs-structure-full.json"), 0o644)
+            # Leftover of a writer which crashed before the replace
+            os.mkdir(self._tmp(".fs-structure-full.json.tmp"))
+            fsm.save_all()
+        self.assertEqual(_mode(self._tmp(".fs-structure-full.json")), 0o644,
+                         "Mode of the replaced structure has been lost")
+        self.assertFalse(
+            [name for name in os.listdir(self.tmp)
+             if name.startswith(".fs-structure-full.json.")
+             and name != ".fs-structure-full.json.tmp"],
+            "Temporary structure file has been left")
+
+    def test_save_all_pretty(self):
+        for pretty in (False, True):
+            with FSManager(base_path=self.tmp, mode=0o744,
+                           temporary=False, pretty_json=pretty) as fsm:
+                fsm.mkfile("test1")
                 fsm.save_all()
-            if not os.path.exists("/tmp/fsm_tests/.fs-structure-full.json"):
-                raise Exception("Failed to save full structure")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-        finally:
-            try:
-                shutil.rmtree("/tmp/fsm_tests", ignore_errors=True)
-            except:
-                pass
+            with open(self._tmp(".fs-structure-full.json")) as f:
+                self.assertEqual("\n" in f.read(), pretty,
+                                 "Wrong formatting of structure")
 
     def test_load_all(self):
-        try:
-            os.makedirs("/tmp/fsm_tests/save1")
-            os.makedirs("/tmp/fsm_tests/save2")
-            with FSManager(base_path="/tmp/fsm_tests/save1",
-                           mode=0o744, temporary=False) as fsm:
-                fsm.mkdir("test1")
-                fsm.mkfile("test1/test11")
-                fsm.mkdir("test2/test22")
-                fsm.cd("test2/test22")
-                fsm.mkfile("test222")
-                fsm.save_all()
-            shutil.copy("/tmp/fsm_tests/save1/.fs-structure-full.json",
-                        "/tmp/fsm_tests/save2/.fs-structure-full.json")
-            with FSManager(base_path="/tmp/fsm_tests/save2",
-                           mode=0o744, temporary=False) as fsm:
-                fsm.load_all()
-                if fsm.file("test1/test11") is None:
-                    raise Exception("Failed to load from full structure")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-        finally:
-            try:
-                shutil.rmtree("/tmp/fsm_tests", ignore_errors=True)
-            except:
-                pass
+        with open(self._tmp(".fs-structure-full.json"), "wb") as f:
+            f.write(self.golden_json)
+        with FSManager(base_path=self.tmp,
+                       mode=0o744, temporary=False) as fsm:
+            fsm.load_all()
+            self.assertIsNotNone(fsm.file("test1/test11"),
+                                 "Failed to load from full structure")
+            fsm.cd("test2/test22")
+            self.assertIsNotNone(fsm.file("test222"),
+                                 "Failed to load from full structure")
 
     def test_save_hashsums(self):
-        try:
-            os.makedirs("/tmp/fsm_tests")
-            with FSManager(base_path="/tmp/fsm_tests/",
-                           temporary=False) as fsm:
-                fsm.mkdir("test1")
-                fsm.mkfile("test1/test_file")
-                fsm.mkdir("test2")
-                fsm.cd("test2")
+        with FSManager(base_path=self.tmp,
+                       temporary=False) as fsm:
+            fsm.mkdir("test1")
+            fsm.mkfile("test1/test_file")
+            fsm.mkdir("test2")
+            fsm.cd("test2")
+            fsm.mkfile("test_file")
+            fsm.cd_root()
+            fsm.save_hashsums()
+            self.assertIs(fsm.current_directory, fsm.root_directory,
+                          "Current directory has been changed")
+        with open(self._tmp("test2/.fs-structure.json")) as f:
+            loaded = json.load(f)
+            self.assertIn("md5", loaded["test_file"],
+                          "Hashsum hasn't been saved")
+        self.assertFalse(
+            os.path.exists(self._tmp("test2/.fs-structure.json.tmp")),
+            "Temporary structure file has been left")
+
+    def test_save_hashsums_many(self):
+        with FSManager(base_path=self.tmp,
+                       temporary=False) as fsm:
+            for i in range(10):
+                fsm.mkfile("test_file%d" % i)
+                with open(self._tmp("test_file%d" % i), "w") as f:
+                    f.write("rambo test %d" % i)
+            fsm.save_hashsums("sha1")
+        with open(self._tmp(".fs-structure.json")) as f:
+            loaded = json.load(f)
+        for i in range(10):
+            content = ("rambo test %d" % i).encode()
+            self.assertEqual(loaded["test_file%d" % i]["sha1"],
+                             hashlib.sha1(content).hexdigest(),
+                             "Wrong hashsum has been saved")
+
+    def test_save_hashsums_changed(self):
+        with FSManager(base_path=self.tmp,
+                       temporary=False) as fsm:
+            fsm.mkfile("test_file")
+            with open(self._tmp("test_file"), "w") as f:
+                f.write("rambo")
+            fsm.save_hashsums()
+            with open(self._tmp("test_file"), "w") as f:
+                f.write("rambo test")
+            fsm.save_hashsums()
+        with open(self._tmp(".fs-structure.json")) as f:
+            loaded = json.load(f)
+        self.assertEqual(loaded["test_file"]["md5"],
+                         hashlib.md5(b"rambo test").hexdigest(),
+                         "Hashsum of changed file hasn't been updated")
+        self.assertIn("md5", loaded["test_file"]["stat"],
+                      "Stat of hashed file hasn't been saved")
+
+    def test_save_hashsums_unchanged(self):
+        with FSManager(base_path=self.tmp,
+                       temporary=False) as fsm:
+            for i in (1, 2):
+                fsm.mkdir("test%d" % i)
+                fsm.cd("test%d" % i)
                 fsm.mkfile("test_file")
                 fsm.cd_root()
-                fsm.save_hashsums()
-            with open("/tmp/fsm_tests/test2/.fs-structure.json") as f:
-                loaded = json.load(f)
-                if "md5" not in loaded["test_file"]:
-                    raise Exception("Hashsum hasn't been saved")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-        finally:
-            try:
-                shutil.rmtree("/tmp/fsm_tests", ignore_errors=True)
-            except:
-                pass
+            fsm.save_hashsums()
+            inodes = [os.stat(self._tmp("test%d/.fs-structure.json" % i))
+                      .st_ino for i in (1, 2)]
+            with open(self._tmp("test2/test_file"), "w") as f:
+                f.write("rambo test")
+            fsm.save_hashsums()
+        self.assertEqual(
+            os.stat(self._tmp("test1/.fs-structure.json")).st_ino, inodes[0],
+            "Unchanged structure has been rewritten")
+        self.assertNotEqual(
+            os.stat(self._tmp("test2/.fs-structure.json")).st_ino, inodes[1],
+            "Changed structure hasn't been rewritten")
 
     def test_check_hassums(self):
-        try:
-            os.makedirs("/tmp/fsm_tests")
-            with FSManager(base_path="/tmp/fsm_tests/",
-                           temporary=False) as fsm:
-                fsm.mkdir("test1")
-                fsm.mkfile("test1/test_file")
-                fsm.mkdir("test2")
-                fsm.cd("test2")
-                fsm.mkfile("test_file")
-                fsm.cd_root()
-                fsm.save_hashsums()
-                with open("/tmp/fsm_tests/test2/test_file", "w") as f:
-                    f.write("change hashsum")
-                mismatch = fsm.check_hashsums(log_warnings=False)
-                if not mismatch:
-                    raise Exception("Checking of hashsums are failed")
-        except Exception as exc:
-            traceback.print_exc()
-            self.fail(exc)
-        finally:
-            try:
-                shutil.rmtree("/tmp/fsm_tests", ignore_errors=True)
-            except:
-                pass
-
+        with FSManager(base_path=self.tmp,
+                       temporary=False) as fsm:
+            fsm.mkdir("test1")
+            fsm.mkfile("test1/test_file")
+            fsm.mkdir("test2")
+            fsm.cd("test2")
+            fsm.mkfile("test_file")
+            fsm.cd_root()
+            fsm.save_hashsums()
+            with open(self._tmp("test2/test_file"), "w") as f:
+                f.write("change hashsum")
+            mismatch = fsm.check_hashsums(log_warnings=False)
+            self.assertTrue(mismatch, "Checking of hashsums are failed")
+
+    def test_check_hashsums_fresh(self):
+        with FSManager(base_path=self.tmp,
+                       temporary=False) as fsm:
+            fsm.mkfile("test_file")
+            fsm.save_hashsums()
+            with open(self._tmp("test_file"), "w") as f:
+                f.write("change hashsum")
+            self.assertEqual(len(fsm.check_hashsums(log_warnings=False)), 1,
+                             "Mismatches are kept between calls")
+            self.assertEqual(len(fsm.check_hashsums(log_warnings=False)), 1,
+                             "Mismatches are kept between calls")
+
+
+    def test_check_hashsums_full(self):
+        with FSManager(base_path=self.tmp,
+                       temporary=False) as fsm:
+            fsm.mkfile("test_file")
+            with open(self._tmp("test_file"), "w") as f:
+                f.write("rambo test")
+            fsm.save_hashsums()
+            # Same size content with the modification time put back
+            st = os.stat(self._tmp("test_file"))
+            with open(self._tmp("test_file"), "w") as f:
+                f.write("rambo TEST")
+            os.utime(self._tmp("test_file"),
+                     ns=(st.st_atime_ns, st.st_mtime_ns))
+            self.assertFalse(fsm.check_hashsums(log_warnings=False),
+                             "File with the same stat has been rehashed")
+            self.assertEqual(
+                len(fsm.check_hashsums(log_warnings=False, full=True)), 1,
+                "Full check hasn't rehashed the file")
 
 if __name__ == "__main__":
     unittest.main()